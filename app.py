@@ -1,9 +1,42 @@
 import streamlit as st
-from datetime import date, timedelta
-import calendar
+from datetime import date
 import pandas as pd
-import altair as alt
-import math
+import numpy as np
+import os
+from importlib.machinery import ModuleSpec
+
+import chartdata
+import charts
+import curve
+import hedge
+import instrumentation
+import ledger
+import periods
+import portfolio
+import report
+import schedule
+import simulation
+import store
+
+# Streamlit runs this script as the '__main__' module, which spawned pool workers (ledger.WORKER_CONTEXT)
+# would run again from its path when they start; a spec named '__main__' tells them to skip it
+__spec__ = ModuleSpec('__main__', None)
+
+# Largest shock x month grid drawn as a heatmap (Altair embeds every cell in the chart spec)
+MAX_HEATMAP_CELLS = 5000
+
+# Uploads at least this large (in total) are parsed in background jobs while the page stays responsive
+BACKGROUND_INGEST_BYTES = int(os.environ.get("LEDGER_BACKGROUND_BYTES", 2 * 1024 * 1024))
+
+# Progress labels of the ledger.IngestionJob stages
+INGEST_STAGE_LABELS = {
+    'queued': "대기 중",
+    'header': "머리글 행 찾는 중",
+    'read_excel': "엑셀 파일 읽는 중",
+    'rows': "행 읽는 중",
+    'done': "완료",
+    'failed': "실패",
+}
 
 # Full page configuration
 st.set_page_config(
@@ -11,22 +44,767 @@ st.set_page_config(
     layout="wide"
 )
 
+# Per-stage wall time and row counts of this rerun; ?debug=1 also traces memory and shows the panel
+debug_mode = st.query_params.get("debug") == "1"
+stage_run = instrumentation.start_run(trace_memory=debug_mode)
+
+# Persistent local store shared by all sessions (enabled by setting LEDGER_STORE_PATH)
+@st.cache_resource
+def get_ledger_store():
+    store_path = os.environ.get("LEDGER_STORE_PATH")
+    return store.LedgerStore(store_path) if store_path else None
+
+# Cache of parsed ledgers shared by all sessions (keyed by file content hash)
+@st.cache_resource
+def get_ledger_cache():
+    return ledger.LedgerCache(
+        max_entries=8,
+        cache_dir=os.environ.get("LEDGER_CACHE_DIR"),
+        store=get_ledger_store(),
+    )
+
+ledger_store = get_ledger_store()
+
 # Initialize session state for hypothetical rates and FX rates
 if 'hypothetical_rates' not in st.session_state:
-    st.session_state.hypothetical_rates = {}
+    # Start from the forward rates saved by earlier sessions, if any
+    st.session_state.hypothetical_rates = ledger_store.load_forward_rates() if ledger_store is not None else {}
+    st.session_state.saved_hypothetical_rates = dict(st.session_state.hypothetical_rates)
 if 'fx_valuation_rates' not in st.session_state:
     st.session_state.fx_valuation_rates = pd.DataFrame()
+if 'rates_editor_version' not in st.session_state:
+    st.session_state.rates_editor_version = 0
+    st.session_state.curve_spot_rate = 0.0
+
+# Fragments drawn by this full run; fragment reruns leave the set as it is
+st.session_state.rendered_fragments = set()
+
+# Function to get the merged monthly aggregates of all uploaded ledgers
+# (memoized per session by upload id, so reruns do not hash the workbooks again).
+# Large uploads are parsed in background jobs: None is returned until every job has finished.
+def load_ledger_summary(files):
+    file_ids = tuple(file.file_id for file in files)
+    jobs = st.session_state.get('ledger_jobs')
+    if jobs is not None and jobs[0] == file_ids and all(job.finished for _, job in jobs[1]):
+        collect_ledger_jobs(jobs)
+    cached = st.session_state.get('ledger_summary_memo')
+    if cached is not None and cached[0] == file_ids:
+        if isinstance(cached[1], Exception):
+            raise cached[1]
+        return cached[1]
+    if jobs is not None and jobs[0] == file_ids:
+        return None
+
+    files_bytes = [file.getvalue() for file in files]
+    if sum(len(file_bytes) for file_bytes in files_bytes) < BACKGROUND_INGEST_BYTES:
+        st.session_state.pop('ledger_jobs', None)
+        merged = ledger.merge_summaries(get_ledger_cache().summaries(files_bytes))
+        st.session_state.ledger_summary_memo = (file_ids, merged)
+        return merged
+    st.session_state.ledger_jobs = (
+        file_ids, [(file.name, get_ledger_cache().submit(file_bytes)) for file, file_bytes in zip(files, files_bytes)]
+    )
+    # Files summarized before come back as finished jobs
+    return load_ledger_summary(files)
+
+# Function to memoize the merged summary of finished background jobs (or the first error, so it is
+# shown again instead of parsing again) and drop the jobs
+def collect_ledger_jobs(jobs):
+    file_ids, file_jobs = jobs
+    errors = [job.error for _, job in file_jobs if job.failed]
+    result = errors[0] if errors else ledger.merge_summaries([job.summary for _, job in file_jobs])
+    st.session_state.ledger_summary_memo = (file_ids, result)
+    st.session_state.pop('ledger_jobs', None)
+
+# Function to check whether uploaded ledgers are being parsed in background jobs the page has not collected yet
+def ledger_ingesting():
+    return st.session_state.get('ledger_jobs') is not None
+
+# Function to explain a missing ledger summary: still being parsed, or nothing uploaded
+def show_ledger_placeholder():
+    if ledger_ingesting():
+        st.info("계정별원장을 처리하는 중입니다. 진행 상황은 왼쪽 사이드바에 표시됩니다.")
+    else:
+        st.info("왼쪽 사이드바에서 계정별원장 파일을 업로드해 주세요.")
+
+# Progress of the background ledger parses, polled every second. Once all have finished their results
+# are collected and the page is rerun, also when they finished while the page was still being drawn.
+@st.fragment(run_every=1.0)
+def render_ingestion_progress():
+    jobs = st.session_state.get('ledger_jobs')
+    if jobs is None:
+        return
+    for name, job in jobs[1]:
+        text = f"{name}: {INGEST_STAGE_LABELS[job.stage]}"
+        if job.rows_read:
+            text += f" · {job.rows_read:,}행" + (f" / 약 {job.total_rows:,}행" if job.total_rows else "")
+        st.progress(job.fraction or 0.0, text=text)
+    if all(job.finished for _, job in jobs[1]):
+        collect_ledger_jobs(jobs)
+        st.rerun()
+
+# Function to get the entered month-end forward rate of every month, using `fallback_rate` where none is entered
+def scenario_base_rates(period_index, fallback_rate):
+    return tuple(
+        rate if rate and rate > 0 else fallback_rate
+        for rate in (st.session_state.hypothetical_rates.get(k, 0.0) for k in period_index.month_keys)
+    )
+
+# Monte Carlo runs, cached per input set (the period index is identified by its month keys);
+# a cached SimulationResult holds only the per-month statistics, not the paths
+@st.cache_data(max_entries=16, show_spinner="몬테카를로 시뮬레이션 중...")
+def run_simulation(df_book, _period_index, month_keys, center_rates, valuation_date, n_paths, seed,
+                   method, volatility, month_end_history):
+    return simulation.simulate_book_pl(
+        df_book, _period_index, center_rates, valuation_date, n_paths, seed,
+        method=method, volatility=volatility, month_end_history=month_end_history,
+    )
+
+# Function to render the Monte Carlo controls, fan chart and VaR/CVaR table for a book
+def render_simulation(df_book, period_index, fallback_rate, month_end_history, key):
+    with st.expander("🎲 몬테카를로 시뮬레이션 (기대손익 · VaR · CVaR)"):
+        col_method, col_paths, col_vol, col_seed = st.columns(4)
+        with col_method:
+            method_label = st.radio(
+                "환율 경로 생성 방식",
+                ["GBM", "부트스트랩"],
+                key=f"{key}_sim_method",
+                help="부트스트랩은 업로드된 계정별원장의 월말 USD 환율 변동을 재표본추출합니다."
+            )
+        with col_paths:
+            n_paths = st.number_input("경로 수", min_value=100, max_value=1_000_000, value=10_000, step=1_000, key=f"{key}_sim_paths")
+        with col_vol:
+            volatility_pct = st.number_input(
+                "연 변동성 (%)", min_value=0.0, max_value=100.0, value=10.0, format="%.1f",
+                key=f"{key}_sim_vol", disabled=method_label != "GBM"
+            )
+        with col_seed:
+            seed = st.number_input("난수 시드", min_value=0, value=42, step=1, key=f"{key}_sim_seed")
+
+        if not st.checkbox("시뮬레이션 실행", key=f"{key}_sim_run"):
+            return
+
+        # Paths are centered on the entered month-end forward rates (spot where none is entered)
+        center_rates = scenario_base_rates(period_index, fallback_rate)
+        if not all(rate > 0 for rate in center_rates):
+            st.warning("예상 통화선도환율 또는 기준 현물환율을 0보다 크게 입력해주세요.")
+            return
+
+        # The month x path matrix of a run is bounded, so long horizons allow fewer paths
+        max_paths = simulation.MAX_SIMULATION_CELLS // len(period_index)
+        if n_paths > max_paths:
+            st.caption(f"{len(period_index)}개월 기간에서는 경로 수가 최대 {max_paths:,}개로 제한됩니다.")
+            n_paths = max_paths
+
+        try:
+            result = run_simulation(
+                df_book, period_index, period_index.month_keys, center_rates, date.today(), int(n_paths), int(seed),
+                'gbm' if method_label == "GBM" else 'bootstrap', volatility_pct / 100, month_end_history,
+            )
+        except ValueError:
+            st.warning("부트스트랩에는 연속된 2개월 이상의 월말 USD 환율이 있는 계정별원장이 필요합니다.")
+            return
+
+        df_bands = result.percentile_bands()
+        df_bands['결산연월'] = df_bands['month_key'].map(periods.month_key_to_label)
+        st.altair_chart(charts.build_fan_chart(df_bands, list(period_index.labels), '월별 파생상품 손익 분포 (백분위 구간)'))
+
+        risk_table = result.risk_table() / 1_000_000
+        risk_table.index = [periods.month_key_to_label(k) for k in risk_table.index]
+        risk_table.index.name = '결산연월'
+        st.write(f"경로 {int(n_paths):,}개 기준 월별 기대손익과 VaR/CVaR(손실을 양수로 표시, 백만원)입니다.")
+        st.dataframe(risk_table.style.format("{:,.2f}"))
+
+# Sensitivity grids, cached per input set (the period index is identified by its month keys)
+@st.cache_data(max_entries=16, show_spinner=False)
+def get_sensitivity_grid(df_book, _period_index, month_keys, base_rates, shock_range, shock_step, monthly_fx_pl):
+    shocks = np.arange(-shock_range, shock_range + shock_step / 2, shock_step)
+    return portfolio.sensitivity_grid(df_book, _period_index, base_rates, shocks, monthly_fx_pl)
+
+# Function to render the rate-shock x settlement-month heatmap for a book
+def render_sensitivity(df_book, period_index, fallback_rate, monthly_fx_pl, key):
+    with st.expander("🌡️ 환율 충격 민감도 히트맵"):
+        col_range, col_step, col_measure = st.columns(3)
+        with col_range:
+            shock_range = st.number_input("충격 범위 (±원)", min_value=1.0, max_value=1000.0, value=200.0, step=10.0, format="%.0f", key=f"{key}_shock_range")
+        with col_step:
+            shock_step = st.number_input("충격 간격 (원)", min_value=0.5, max_value=100.0, value=5.0, step=0.5, format="%.1f", key=f"{key}_shock_step")
+        with col_measure:
+            measure = st.radio("표시 손익", ["파생상품 손익", "순손익"], key=f"{key}_shock_measure",
+                               help="순손익은 파생상품 손익에 업로드된 계정별원장의 외화환산손익을 더한 값입니다.")
+
+        base_rates = scenario_base_rates(period_index, fallback_rate)
+        if not all(rate > 0 for rate in base_rates):
+            st.warning("예상 통화선도환율 또는 기준 현물환율을 0보다 크게 입력해주세요.")
+            return
+
+        num_cells = (int(2 * shock_range / shock_step) + 1) * len(period_index)
+        if num_cells > MAX_HEATMAP_CELLS:
+            st.warning(f"히트맵 셀 수({num_cells:,})가 너무 많습니다. 충격 간격을 늘리거나 범위를 줄여주세요.")
+            return
+
+        df_grid = get_sensitivity_grid(
+            df_book, period_index, period_index.month_keys, base_rates, shock_range, shock_step, monthly_fx_pl
+        ).copy()
+        df_grid['결산연월'] = df_grid['month_key'].map(periods.month_key_to_label)
+        df_grid['손익 (백만원)'] = df_grid[measure] / 1_000_000
+
+        heatmap = charts.build_heatmap(df_grid, list(period_index.labels), measure)
+        st.altair_chart(heatmap)
+
+# Hedge-effectiveness results, cached per input set
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_hedge_effectiveness(month_keys, derivative_pl, monthly_fx_pl, window):
+    return hedge.assess_hedge(month_keys, derivative_pl, monthly_fx_pl, window)
+
+# Per-contract effectiveness of a book, cached per book and forward rates (the scenario table is not hashed)
+@st.cache_data(max_entries=8, show_spinner="계약별 헤지 효과 계산 중...")
+def get_contract_effectiveness(df_book, _scenario_table, month_keys, rates, monthly_fx_pl):
+    return hedge.contract_effectiveness(_scenario_table, monthly_fx_pl)
+
+# Chart spec of a book's P&L at a display grain, cached per book, forward rates, FX P&L and grain
+# (the aggregated frame is embedded in the spec; the scenario table is not hashed)
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_book_chart_spec(df_book, _scenario_table, month_keys, rates, monthly_fx_pl, grain):
+    pl_table = portfolio.monthly_pl_table(_scenario_table.monthly_totals(), monthly_fx_pl)
+    df_chart = chartdata.aggregate_months(_scenario_table.periods, {
+        "평가손익 (백만원)": pl_table['평가손익'].to_numpy() / 1_000_000,
+        "거래손익 (백만원)": pl_table['거래손익'].to_numpy() / 1_000_000,
+        "외화환산손익 (백만원)": pl_table['외화환산손익'].to_numpy() / 1_000_000,
+    }, grain)
+    return charts.build_scenario_chart(
+        df_chart, list(df_chart['결산연월']), f"{chartdata.GRAINS[grain]} 포트폴리오 파생상품 및 외화평가 손익 시나리오"
+    ).to_dict()
+
+# Chart spec of a book's P&L by contract group, cached per input set (None if it exceeds the chart row limit)
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_breakdown_chart_spec(df_book, _scenario_table, month_keys, rates, dimension, measure, grain):
+    df_breakdown = chartdata.breakdown_frame(_scenario_table, dimension, measure, grain)
+    if len(df_breakdown) > chartdata.MAX_CHART_ROWS:
+        return None
+    return charts.build_breakdown_chart(
+        df_breakdown, list(dict.fromkeys(df_breakdown['결산연월'])), f"{dimension}별 {measure}", dimension
+    ).to_dict()
+
+# Contracts behind one bar of the breakdown, cached per input set and selection
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_drill_down(df_book, _scenario_table, month_keys, rates, period, grain, dimension, group):
+    return chartdata.drill_down(_scenario_table, period, grain, dimension, group)
+
+# Function to render a book's P&L by contract group and the contracts of one period and group
+def render_breakdown(df_book, book_table, grain, key):
+    with st.expander("🔍 계약 구분별 손익 및 계약 상세"):
+        col_dimension, col_measure = st.columns(2)
+        with col_dimension:
+            dimension = st.selectbox("구분 기준", chartdata.breakdown_dimensions(df_book), key=f"{key}_breakdown_dimension")
+        with col_measure:
+            measure = st.radio("손익", chartdata.MEASURES, horizontal=True, key=f"{key}_breakdown_measure")
+
+        month_keys, rates = book_table.periods.month_keys, tuple(book_table.rates)
+        spec = get_breakdown_chart_spec(df_book, book_table, month_keys, rates, dimension, measure, grain)
+        if spec is None:
+            st.warning("표시할 막대가 너무 많습니다. 차트 기간 단위를 분기나 연으로 바꿔주세요.")
+        else:
+            st.vega_lite_chart(spec)
+
+        # Only the selected period and group are fetched from the scenario table
+        _, period_labels = chartdata.period_buckets(book_table.periods, grain)
+        _, groups = chartdata.contract_groups(df_book, dimension)
+        col_period, col_group = st.columns(2)
+        with col_period:
+            period = st.selectbox("결산 기간", range(len(period_labels)), format_func=period_labels.__getitem__,
+                                  key=f"{key}_drill_period_{grain}")
+        with col_group:
+            group = st.selectbox(dimension, [None] + groups, format_func=lambda g: "전체" if g is None else g,
+                                 key=f"{key}_drill_group_{dimension}")
+        df_contracts, count = get_drill_down(df_book, book_table, month_keys, rates, period, grain, dimension, group)
+
+        shown = f" 중 파생상품 손익 절댓값 상위 {len(df_contracts):,}건" if count > len(df_contracts) else ""
+        st.write(f"{period_labels[period]}에 계약 기간이 걸친 계약 {count:,}건{shown}입니다.")
+        st.dataframe(
+            df_contracts,
+            column_config={
+                col: st.column_config.NumberColumn(format="localized")
+                for col in ('거래금액($)', '평가손익', '거래손익', '파생상품 손익')
+            },
+            hide_index=True,
+        )
+
+# Function to render how well the derivative P&L offsets the ledger's FX P&L (and, for a book, each contract)
+def render_hedge_effectiveness(period_index, derivative_pl, monthly_fx_pl, key, book_table=None):
+    with st.expander("🛡️ 헤지 효과 분석 (상계비율 · 회귀분석)"):
+        if not monthly_fx_pl:
+            st.info("계정별원장을 업로드하면 파생상품 손익과 외화환산손익의 헤지 효과를 계산합니다.")
+            return
+        window = st.number_input("이동 구간 (개월)", min_value=2, max_value=12, value=hedge.ROLLING_WINDOW, step=1,
+                                 key=f"{key}_hedge_window")
+        result = get_hedge_effectiveness(period_index.month_keys, tuple(derivative_pl), monthly_fx_pl, int(window))
+        if result.observations == 0:
+            st.info("기간에 해당하는 외화환산손익 데이터가 업로드된 파일에 없습니다.")
+            return
+
+        low, high = hedge.EFFECTIVE_OFFSET_RANGE
+        slope_low, slope_high = hedge.EFFECTIVE_SLOPE_RANGE
+        col_offset, col_slope, col_r_squared, col_verdict = st.columns(4)
+        with col_offset:
+            st.metric(label="상계비율", value=f"{result.dollar_offset:.1%}" if pd.notna(result.dollar_offset) else "-")
+        with col_slope:
+            st.metric(label="회귀 기울기", value=f"{result.slope:,.3f}" if pd.notna(result.slope) else "-")
+        with col_r_squared:
+            st.metric(label="R²", value=f"{result.r_squared:.3f}" if pd.notna(result.r_squared) else "-")
+        with col_verdict:
+            if pd.isna(result.slope):
+                st.metric(label="헤지 효과", value="판단 불가")
+            else:
+                st.metric(label="헤지 효과", value="유효" if result.effective else "비유효")
+        st.caption(
+            f"외화환산손익이 있는 {result.observations}개월 기준입니다. 상계비율(-Σ파생상품 손익 / Σ외화환산손익)이 "
+            f"{low:.0%}~{high:.0%}, 회귀 기울기가 {slope_low}~{slope_high}, R²가 {hedge.EFFECTIVE_R_SQUARED} 이상이면 유효로 판단합니다."
+        )
+
+        df_effectiveness = result.table.reset_index()
+        df_effectiveness['결산연월'] = df_effectiveness['month_key'].map(periods.month_key_to_label)
+        for column in ('누적 상계비율', '이동 상계비율'):
+            df_effectiveness[f'{column} (%)'] = df_effectiveness[column] * 100
+        st.altair_chart(charts.build_effectiveness_chart(
+            df_effectiveness, list(period_index.labels), f'월별 상계비율 (이동 구간 {result.window}개월)', hedge.EFFECTIVE_OFFSET_RANGE
+        ))
+        st.dataframe(
+            df_effectiveness[['결산연월', '파생상품 손익', '외화환산손익', '상계비율', '누적 상계비율',
+                              '이동 상계비율', '이동 기울기', '이동 R²']],
+            column_config={
+                '파생상품 손익': st.column_config.NumberColumn('파생상품 손익 (원)', format="localized"),
+                '외화환산손익': st.column_config.NumberColumn('외화환산손익 (원)', format="localized"),
+                '상계비율': st.column_config.NumberColumn(format="percent"),
+                '누적 상계비율': st.column_config.NumberColumn(format="percent"),
+                '이동 상계비율': st.column_config.NumberColumn(format="percent"),
+                '이동 기울기': st.column_config.NumberColumn(format="%.3f"),
+                '이동 R²': st.column_config.NumberColumn(format="%.3f"),
+            },
+            hide_index=True,
+        )
+
+        if book_table is not None:
+            # Every contract paired with the ledger's FX P&L, fitted in one vectorized pass
+            df_contracts = get_contract_effectiveness(
+                book_table.df_book, book_table, period_index.month_keys, tuple(book_table.rates), monthly_fx_pl
+            )
+            st.write(f"계약별 헤지 효과: 유효 {int(df_contracts['유효'].sum()):,}건 / 전체 {len(df_contracts):,}건")
+            st.dataframe(
+                df_contracts,
+                column_config={
+                    '거래금액($)': st.column_config.NumberColumn(format="localized"),
+                    '상계비율': st.column_config.NumberColumn(format="percent"),
+                    '기울기': st.column_config.NumberColumn(format="%.3f"),
+                    'R²': st.column_config.NumberColumn(format="%.3f"),
+                },
+                hide_index=True,
+            )
+
+# Function to get the session's scenario table of a book, patched to the current forward rates
+# (only the months whose rate changed since the last rerun are revalued)
+def scenario_table(name, df_book, period_index):
+    tables = st.session_state.setdefault('scenario_tables', {})
+    table = tables.get(name)
+    if table is None or not table.matches(df_book, period_index):
+        table = portfolio.ScenarioTable(df_book, period_index, st.session_state.hypothetical_rates)
+        tables[name] = table
+    else:
+        table.update(st.session_state.hypothetical_rates)
+    return table
+
+# Parsed contract books, keyed by file content and maturity convention
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_contract_book(file_bytes, filename, convention):
+    return portfolio.load_contract_book(file_bytes, filename, convention)
+
+# Sections drawn as fragments that depend on the month-end forward rates
+RATE_FRAGMENTS = ["contract_result", "scenario", "portfolio"]
+
+# Fragments that depend on each contract value input; the inputs that change the month grid
+# (start date, tenor) or the validation messages rerun the whole page instead
+CONTRACT_VALUE_FRAGMENTS = {
+    "transaction_type": ["contract_result", "scenario"],
+    "amount_usd": ["contract_result", "scenario"],
+    "contract_rate": ["contract_result", "scenario", "rate_trend"],
+    "end_spot_rate": ["contract_result", "scenario"],
+}
+
+# Function to mark a fragment as drawn in the current full run, so widget callbacks can rerun it by key
+def mark_rendered(fragment_key):
+    st.session_state.rendered_fragments.add(fragment_key)
+
+# Function called first in every keyed fragment. A fragment already drawn by the full run is being rerun
+# on its own, in a script thread without the full run's stage context, so its stages are recorded as a new run.
+def begin_fragment(fragment_key):
+    if fragment_key in st.session_state.rendered_fragments:
+        instrumentation.start_run(trace_memory=debug_mode)
+    mark_rendered(fragment_key)
+
+# Function to rerun only the drawn fragments among `fragment_keys` from a widget callback
+# (returning without a rerun request keeps Streamlit's default: the full page, or the widget's own fragment)
+def rerun_fragments(fragment_keys):
+    drawn = [key for key in fragment_keys if key in st.session_state.rendered_fragments]
+    if drawn:
+        st.rerun(drawn)
+
+# Function to check that the contract inputs are complete and consistent, from the widget state
+def contract_inputs_valid():
+    state = st.session_state
+    amounts = (state.amount_usd, state.contract_rate, state.start_spot_rate, state.end_spot_rate)
+    return all(value > 0 for value in amounts) and not state.contract_rate > state.start_spot_rate
+
+# Callback of the contract value inputs: only the sections using the input are redrawn
+def on_contract_value_change(input_key):
+    # Inputs that turn the validation messages on or off change the page layout, so they rerun everything
+    if st.session_state.get("contract_inputs_valid") and contract_inputs_valid():
+        rerun_fragments(CONTRACT_VALUE_FRAGMENTS[input_key])
+
+# Function to save the forward rates the user set for `month_keys` (editor edits and curve fills) that changed
+# since they were last saved. The 0.0 placeholders of newly shown months are never saved, since the store is
+# shared and a placeholder would overwrite a rate another session saved for that month.
+def persist_forward_rates(month_keys):
+    if ledger_store is None:
+        return
+    rates = st.session_state.hypothetical_rates
+    changed_rates = {
+        month_key: rates[month_key] for month_key in month_keys
+        if st.session_state.saved_hypothetical_rates.get(month_key) != rates[month_key]
+    }
+    if changed_rates:
+        ledger_store.save_forward_rates(changed_rates)
+        st.session_state.saved_hypothetical_rates.update(changed_rates)
+
+# Callback of the forward-rate editor: writes the edited cells back and redraws the rate-dependent sections
+def apply_rate_edits(editor_key, month_keys):
+    edited_keys = []
+    for row, changes in st.session_state[editor_key]["edited_rows"].items():
+        if "예상 통화선도환율" in changes:
+            updated_rate = changes["예상 통화선도환율"]
+            # Set the value to 0.0 if the user deletes it (it becomes None/NaN)
+            st.session_state.hypothetical_rates[month_keys[int(row)]] = updated_rate if pd.notna(updated_rate) else 0.0
+            edited_keys.append(month_keys[int(row)])
+    persist_forward_rates(edited_keys)
+    rerun_fragments(RATE_FRAGMENTS)
+
+# Callback of the curve's 기준 현물환율, which is also the fallback rate of the sensitivity and simulation views
+def on_curve_spot_change(widget_key):
+    st.session_state.curve_spot_rate = st.session_state[widget_key]
+    rerun_fragments(["curve_inputs", "scenario", "portfolio"])
+
+# Forward curve inputs: editing swap points only reruns this fragment; filling the rates reruns the page
+@st.fragment(key="curve_inputs")
+def render_curve_inputs(start_spot_rate, curve_closing_dates):
+    begin_fragment("curve_inputs")
+    st.caption("현물환율과 기일물별 스왑포인트로 각 월말의 예상 통화선도환율을 계산해 채웁니다. 채운 뒤에도 표에서 직접 수정할 수 있습니다.")
+    # The input follows 시작 시점 현물환율 until it is edited, as its key changes with that default
+    spot_key = f"curve_spot_rate_{start_spot_rate}"
+    curve_spot_rate = st.number_input(
+        label="기준 현물환율",
+        min_value=0.0,
+        format="%.2f",
+        value=start_spot_rate,
+        key=spot_key,
+        on_change=on_curve_spot_change,
+        args=(spot_key,),
+        help="커브 기준일의 현물환율을 입력하세요."
+    )
+    st.session_state.curve_spot_rate = curve_spot_rate
+    curve_date = st.date_input(
+        label="커브 기준일",
+        value=date.today(),
+        help="스왑포인트가 고시된 기준일을 선택하세요."
+    )
+    swap_points_df = st.data_editor(
+        pd.DataFrame({
+            "기일물": list(tenor_options.keys()),
+            "스왑포인트": [0.0] * len(tenor_options),
+        }),
+        column_config={
+            "기일물": st.column_config.TextColumn("기일물", disabled=True),
+            "스왑포인트": st.column_config.NumberColumn(
+                "스왑포인트 (원)",
+                format="%.2f",
+                help="기일물별 스왑포인트(선도환율 - 현물환율)를 입력하세요."
+            ),
+        },
+        hide_index=True,
+        num_rows="fixed",
+        key="swap_points_editor",
+    )
+    if st.button("예상 통화선도환율 채우기", disabled=not curve_spot_rate > 0):
+        # Every month shown in the editor: the contract's months and the uploaded book's months
+        curve_month_keys = sorted(curve_closing_dates)
+        # Swap points are anchored at the actual days from the curve date to each tenor's scheduled maturity
+        tenor_maturities = schedule.maturity_dates([curve_date] * len(tenor_options), list(tenor_options.values()))
+        tenor_days = (tenor_maturities - schedule.as_days(curve_date)).astype(np.int64)
+        swap_points = tuple(
+            (int(days), float(points) if pd.notna(points) else 0.0)
+            for days, points in zip(tenor_days, swap_points_df["스왑포인트"])
+        )
+        curve_rates = curve.forward_curve(
+            curve_spot_rate, curve_date, swap_points, tuple(curve_closing_dates[key] for key in curve_month_keys)
+        )
+        for month_key, rate in zip(curve_month_keys, curve_rates):
+            st.session_state.hypothetical_rates[month_key] = round(float(rate), 2)
+        persist_forward_rates(curve_month_keys)
+        # A new editor key drops cell edits made on top of the previous rates
+        st.session_state.rates_editor_version += 1
+        st.rerun()
+
+# Month-end forward-rate editor; an edit reruns only this editor and the rate-dependent sections
+@st.fragment(key="rates_editor")
+def render_rates_editor(editor_months):
+    begin_fragment("rates_editor")
+    month_keys = [month_key for month_key, _ in editor_months]
+    df_rates = pd.DataFrame({
+        "결산일자": [editor_label for _, editor_label in editor_months],
+        "예상 통화선도환율": [st.session_state.hypothetical_rates.get(month_key) for month_key in month_keys],
+        "month_key": month_keys, # Key for internal use
+    })
+    # Cell edits are kept per widget key, so the key changes with the listed months
+    editor_key = f"rates_editor_{st.session_state.rates_editor_version}_{hash(tuple(month_keys))}"
+    st.data_editor(
+        df_rates,
+        column_config={
+            "결산일자": st.column_config.TextColumn(
+                "결산일자",
+                disabled=True,
+            ),
+            "예상 통화선도환율": st.column_config.NumberColumn(
+                "예상 통화선도환율",
+                min_value=0.0,
+                format="%.2f",
+                help="이 달의 예상 통화선도환율을 입력하세요."
+            ),
+            "month_key": None
+        },
+        hide_index=True,
+        num_rows="fixed",
+        key=editor_key,
+        on_change=apply_rate_edits,
+        args=(editor_key, month_keys),
+    )
+
+# Single-contract P&L at the selected settlement month (contract value inputs and forward rates)
+@st.fragment(key="contract_result")
+def render_contract_result(period_index, settlement_position):
+    begin_fragment("contract_result")
+    transaction_type = st.session_state.transaction_type
+    amount_usd = st.session_state.amount_usd
+    contract_rate = st.session_state.contract_rate
+    end_spot_rate = st.session_state.end_spot_rate
+
+    settlement_date_corrected = period_index.closing_dates[settlement_position]
+    settlement_month = settlement_date_corrected.month
+    settlement_month_key = period_index.month_keys[settlement_position]
+
+    is_expiry_month = bool(period_index.is_expiry[settlement_position])
+
+    # Transaction P&L is always calculated
+    expiry_profit_loss = portfolio.contract_pl(transaction_type, amount_usd, contract_rate, end_spot_rate)
+
+    # Valuation P&L is calculated only if it's not the maturity month
+    if not is_expiry_month:
+        settlement_forward_rate_for_calc = st.session_state.hypothetical_rates.get(settlement_month_key, 0)
+
+        if settlement_forward_rate_for_calc <= 0:
+            st.warning("선택된 결산일자에 대한 '예상 통화선도환율'을 0보다 크게 입력해주세요.")
+        else:
+            valuation_profit_loss = portfolio.contract_pl(
+                transaction_type, amount_usd, contract_rate, settlement_forward_rate_for_calc
+            )
+            if transaction_type == "선매도":
+                valuation_rate_diff_text = f"{contract_rate:,.2f} - {settlement_forward_rate_for_calc:,.2f}"
+            else: # Buy forward
+                valuation_rate_diff_text = f"{settlement_forward_rate_for_calc:,.2f} - {contract_rate:,.2f}"
 
-# Function to accurately calculate the contract period in months/years
-def add_months_to_date(d, months):
-    """
-    Adds months to a given date and returns an accurate date.
-    Example: Adding 1 month to January 31st results in February 28th or 29th (leap year).
-    """
-    year = d.year + (d.month + months - 1) // 12
-    month = (d.month + months - 1) % 12 + 1
-    day = min(d.day, calendar.monthrange(year, month)[1])
-    return date(year, month, day)
+            # Display valuation P&L result
+            st.header(f"{settlement_month}월 결산시점 파생상품 평가손익 분석 결과")
+            st.write("선택된 결산일에 예상 환율을 기준으로 계산한 평가손익입니다.")
+            col_valuation_result, col_valuation_diff = st.columns(2)
+            with col_valuation_result:
+                if valuation_profit_loss >= 0:
+                    st.metric(label="파생상품 평가손익 (원)", value=f"{valuation_profit_loss:,.0f}원", delta="이익")
+                else:
+                    st.metric(label="파생상품 평가손익 (원)", value=f"{valuation_profit_loss:,.0f}원", delta="손실", delta_color="inverse")
+            with col_valuation_diff:
+                st.metric(label="환율 차이 (원)", value=f"{settlement_forward_rate_for_calc - contract_rate:,.2f}원")
+            st.markdown(f"**총 파생상품 평가손익:** ${amount_usd:,.0f} * ({valuation_rate_diff_text}) = {valuation_profit_loss:,.0f}원")
+
+    # Display transaction P&L result if it's the maturity month
+    else:
+        st.header(f"{settlement_month}월 결산시점 파생상품 거래손익 분석결과")
+        st.write("만기 시점의 현물환율을 기준으로 계산한 실제 손익입니다.")
+        col_expiry_result, col_expiry_diff = st.columns(2)
+        if transaction_type == "선매도":
+            expiry_rate_diff_text = f"{contract_rate:,.2f} - {end_spot_rate:,.2f}"
+        else: # Buy forward
+            expiry_rate_diff_text = f"{end_spot_rate:,.2f} - {contract_rate:,.2f}"
+        with col_expiry_result:
+            if expiry_profit_loss >= 0:
+                st.metric(label="파생상품 거래손익 (원)", value=f"{expiry_profit_loss:,.0f}원", delta="이익")
+            else:
+                st.metric(label="파생상품 거래손익 (원)", value=f"{expiry_profit_loss:,.0f}원", delta="손실", delta_color="inverse")
+        with col_expiry_diff:
+            st.metric(label="환율 차이 (원)", value=f"{end_spot_rate - contract_rate:,.2f}원")
+        st.markdown(f"**총 파생상품 거래손익:** ${amount_usd:,.0f} * ({expiry_rate_diff_text}) = {expiry_profit_loss:,.0f}원")
+
+# FX P&L of the settlement month from the uploaded ledgers (ledger summary and settlement month only)
+@st.fragment(key="ledger_analysis")
+def render_ledger_analysis(ledger_summary, settlement_month_key):
+    begin_fragment("ledger_analysis")
+    if ledger_summary is None:
+        show_ledger_placeholder()
+        return
+
+    monthly_fx_pl = ledger_summary.monthly_fx_pl
+
+    # Display FX P&L metric here
+    if settlement_month_key in monthly_fx_pl:
+        selected_month_fx_pl = monthly_fx_pl[settlement_month_key]
+        if selected_month_fx_pl >= 0:
+            st.metric(label="외화환산손익 (원)", value=f"{selected_month_fx_pl:,.0f}원", delta="이익")
+        else:
+            st.metric(label="외화환산손익 (원)", value=f"{selected_month_fx_pl:,.0f}원", delta="손실", delta_color="inverse")
+    else:
+        st.info("선택된 결산일에 해당하는 외화환산손익 데이터가 업로드된 파일에 없습니다.")
+
+# Scenario chart, sensitivity and simulation of the single contract
+# (contract value inputs, forward rates and the ledger's FX P&L)
+@st.fragment(key="scenario")
+def render_scenario(period_index, start_date, contract_months, maturity_convention, ledger_summary):
+    begin_fragment("scenario")
+    st.subheader("📊 파생상품 및 외화평가 기간별 총 손익 시나리오")
+
+    ordered_month_strings = list(period_index.labels)
+    monthly_fx_pl = ledger_summary.monthly_fx_pl if ledger_summary is not None else {}
+
+    # Value the contract for every month in one vectorized pass (a book of one contract)
+    contract_book = portfolio.single_contract_book(
+        st.session_state.transaction_type, st.session_state.amount_usd, st.session_state.contract_rate,
+        start_date, contract_months, st.session_state.end_spot_rate, maturity_convention
+    )
+    with instrumentation.stage('scenario construction', rows=len(period_index)):
+        # Same monthly table as the batch close (batch.py), with the FX P&L of the uploaded files
+        contract_pl_table = portfolio.monthly_pl_table(
+            scenario_table("contract", contract_book, period_index).monthly_totals(), monthly_fx_pl
+        )
+
+        df_scenario = pd.DataFrame({
+            "결산연월": ordered_month_strings,
+            "파생상품 손익 (백만원)": contract_pl_table['파생상품 손익'].to_numpy() / 1_000_000,
+            "외화환산손익 (백만원)": contract_pl_table['외화환산손익'].to_numpy() / 1_000_000,
+        })
+
+    # Generate and display Altair chart
+    st.write("각 월에 대한 파생상품 손익과 업로드된 파일의 외화환산손익을 비교합니다.")
+    bar_chart = charts.build_scenario_chart(df_scenario, ordered_month_strings, '월별 파생상품 및 외화평가 손익 시나리오')
+    with instrumentation.stage('st.altair_chart (scenario)'):
+        st.altair_chart(bar_chart)
+
+    render_hedge_effectiveness(period_index, contract_pl_table['파생상품 손익'].to_numpy(), monthly_fx_pl, key="contract")
+
+    curve_spot_rate = st.session_state.curve_spot_rate
+    render_sensitivity(contract_book, period_index, curve_spot_rate, monthly_fx_pl, key="contract")
+    render_simulation(
+        contract_book, period_index, curve_spot_rate,
+        ledger_summary.usd_month_end_rates if ledger_summary is not None else {}, key="contract"
+    )
+
+# Contract rate against the ledger's month-end rates (계약환율 and the ledger summary only)
+@st.fragment(key="rate_trend")
+def render_rate_trend(ordered_month_strings, ledger_summary):
+    begin_fragment("rate_trend")
+    st.subheader("📈 외화평가 시점별 환율 변동 추이")
+
+    # If a file is uploaded, process it
+    if ledger_summary is None:
+        show_ledger_placeholder()
+        return
+
+    currencies = ledger_summary.currencies
+    if not currencies:
+        st.info("업로드된 파일에 월말 외화평가 환율이 없습니다.")
+        return
+
+    # Any currency of the cached month x currency rate panel can be shown without rescanning the ledger
+    currency = st.selectbox(
+        "통화",
+        currencies,
+        index=currencies.index("USD") if "USD" in currencies else 0,
+        key="rate_trend_currency",
+        help="월말(마지막 영업일 이후 마지막 전기일) 외화평가 환율을 표시할 통화를 선택하세요."
+    )
+    month_end_rates = ledger_summary.month_end_rates[currency]
+
+    # 월말 환율을 'ordered_month_strings'와 동일한 형식의 '결산연월'로 변환
+    df_monthly_rates_from_ledger = pd.DataFrame({
+        '결산연월': [periods.month_key_to_label(key) for key in month_end_rates],
+        '외화평가 환율': list(month_end_rates.values()),
+    })
+
+    # Create a single DataFrame for the chart based on the canonical month list
+    df_rates_for_chart = pd.DataFrame({'결산연월': ordered_month_strings})
+    if currency == "USD":
+        # The contract is a USD/KRW forward, so its rate is only comparable to the USD closing rates
+        df_rates_for_chart['계약환율'] = st.session_state.contract_rate
+
+    # Merge the FX valuation rates into the main DataFrame
+    df_rates_for_chart = pd.merge(df_rates_for_chart, df_monthly_rates_from_ledger,
+                                   on='결산연월', how='left')
+    if df_rates_for_chart.drop(columns='결산연월').isna().all(axis=None):
+        st.info(f"계약 기간에 해당하는 {currency} 월말 외화평가 환율이 업로드된 파일에 없습니다.")
+        return
+
+    line_chart = charts.build_rate_chart(df_rates_for_chart, ordered_month_strings)
+    with instrumentation.stage('st.altair_chart (rates)'):
+        st.altair_chart(line_chart)
+
+    with st.expander("통화별 월말 외화평가 환율표"):
+        df_panel = ledger_summary.rate_panel()
+        df_panel.index = [periods.month_key_to_label(key) for key in df_panel.index]
+        df_panel.index.name = '결산연월'
+        st.dataframe(df_panel.style.format("{:,.2f}", na_rep="-"))
+
+# Portfolio P&L scenario: every contract of the uploaded book valued in one pass (book, forward rates, ledger)
+@st.fragment(key="portfolio")
+def render_portfolio(df_book, ledger_summary):
+    begin_fragment("portfolio")
+    book_period_index = portfolio.book_periods(df_book)
+    book_fx_pl = ledger_summary.monthly_fx_pl if ledger_summary is not None else {}
+    book_month_end_rates = ledger_summary.usd_month_end_rates if ledger_summary is not None else {}
+
+    with instrumentation.stage('portfolio scenario construction', rows=len(df_book)):
+        # Same monthly table as the batch close (batch.py)
+        book_table = scenario_table("book", df_book, book_period_index)
+        book_pl_table = portfolio.monthly_pl_table(book_table.monthly_totals(), book_fx_pl)
+
+    st.write(f"업로드된 계약 {len(df_book):,}건을 각 월말의 예상 통화선도환율로 일괄 평가한 손익입니다. 만기월에는 '만기 시점 현물환율'(없으면 해당 월 예상 통화선도환율)로 거래손익을 계산합니다.")
+    grains = list(chartdata.GRAINS)
+    grain = st.radio(
+        "차트 기간 단위",
+        grains,
+        index=grains.index(chartdata.default_grain(book_period_index)),
+        horizontal=True,
+        key="book_chart_grain",
+        help="월별 손익을 분기·연 단위로 합산해 표시합니다. 합산된 값만 차트로 전송되므로 기간이 길어도 차트가 가볍습니다."
+    )
+    # Aggregated on the server to the grain shown, so the spec size depends on the periods only
+    with instrumentation.stage('book chart spec', rows=len(book_period_index)):
+        book_chart_spec = get_book_chart_spec(
+            df_book, book_table, book_period_index.month_keys, tuple(book_table.rates), book_fx_pl, grain
+        )
+    st.vega_lite_chart(book_chart_spec)
+    render_breakdown(df_book, book_table, grain, key="book")
+
+    render_hedge_effectiveness(
+        book_period_index, book_pl_table['파생상품 손익'].to_numpy(), book_fx_pl, key="book", book_table=book_table
+    )
+
+    curve_spot_rate = st.session_state.curve_spot_rate
+    render_sensitivity(df_book, book_period_index, curve_spot_rate, book_fx_pl, key="book")
+    render_simulation(df_book, book_period_index, curve_spot_rate, book_month_end_rates, key="book")
 
 # Sidebar configuration
 st.sidebar.header("파생상품 계약 정보")
@@ -35,6 +813,9 @@ st.sidebar.header("파생상품 계약 정보")
 transaction_type = st.sidebar.selectbox(
     label="선도환거래종류",
     options=["선매도", "선매수"],
+    key="transaction_type",
+    on_change=on_contract_value_change,
+    args=("transaction_type",),
     help="거래 종류에 따라 손익 계산 방식이 달라집니다."
 )
 
@@ -44,6 +825,9 @@ amount_usd = st.sidebar.number_input(
     min_value=0.0,
     format="%.2f",
     value=0.0,
+    key="amount_usd",
+    on_change=on_contract_value_change,
+    args=("amount_usd",),
     help="거래에 사용된 금액을 달러($) 단위로 입력하세요."
 )
 
@@ -53,19 +837,22 @@ contract_rate = st.sidebar.number_input(
     min_value=0.0,
     format="%.2f",
     value=0.0,
+    key="contract_rate",
+    on_change=on_contract_value_change,
+    args=("contract_rate",),
     help="계약 시점의 통화선도환율을 입력하세요."
 )
 
-# 2. Tenor selection menu
+# 2. Tenor selection menu (tenor -> months; maturity dates are scheduled on the holiday calendar)
 tenor_options = {
-    "1개월물": 30,
-    "2개월물": 60,
-    "3개월물": 90,
-    "6개월물": 180,
-    "9개월물": 270,
-    "1년물": 365,
-    "2년물": 365 * 2,
-    "3년물": 365 * 3,
+    "1개월물": 1,
+    "2개월물": 2,
+    "3개월물": 3,
+    "6개월물": 6,
+    "9개월물": 9,
+    "1년물": 12,
+    "2년물": 24,
+    "3년물": 36,
 }
 selected_tenor = st.sidebar.selectbox(
     label="기일물",
@@ -73,7 +860,12 @@ selected_tenor = st.sidebar.selectbox(
     index=1, # Default: 2 months
     help="계약 기간(기일물)을 선택하세요."
 )
-tenor_days = tenor_options[selected_tenor]
+maturity_convention = st.sidebar.selectbox(
+    label="만기일 영업일 조정",
+    options=list(schedule.ROLL_CONVENTIONS),
+    format_func=schedule.ROLL_CONVENTIONS.get,
+    help="만기일이 주말이나 서울·뉴욕 휴일이면 익영업일로 옮깁니다. 수정익영업일은 익영업일이 다음 달이면 직전 영업일로 옮깁니다. 업로드한 계약 목록에도 같은 기준을 적용합니다."
+)
 
 # 3. Contract date and rate input fields
 st.sidebar.subheader("파생상품 계약일자")
@@ -90,20 +882,17 @@ with col_start_rate:
         min_value=0.0,
         format="%.2f",
         value=0.0,
+        key="start_spot_rate",
         help="계약 시작일의 현물환율을 입력하세요."
     )
 
 col_end_date, col_end_rate = st.sidebar.columns(2)
-# Calculate contract maturity date based on tenor
-if selected_tenor.endswith("개월물") or selected_tenor.endswith("년물"):
-    months_to_add = 0
-    if selected_tenor.endswith("개월물"):
-        months_to_add = int(selected_tenor.replace("개월물", ""))
-    elif selected_tenor.endswith("년물"):
-        months_to_add = int(selected_tenor.replace("년물", "")) * 12
-    end_date = add_months_to_date(start_date, months_to_add)
-else:
-    end_date = start_date + timedelta(days=tenor_days)
+# Maturity: the tenor added to the start date, rolled to a Seoul and New York business day
+contract_months = tenor_options[selected_tenor]
+end_date = schedule.maturity_dates(start_date, contract_months, convention=maturity_convention).item()
+
+# Shared month grid of the contract (start month through expiry month), memoized across reruns
+contract_period_index = periods.contract_periods(start_date, end_date)
 
 with col_end_date:
     st.date_input(
@@ -118,42 +907,34 @@ with col_end_rate:
         min_value=0.0,
         format="%.2f",
         value=0.0,
+        key="end_spot_rate",
+        on_change=on_contract_value_change,
+        args=("end_spot_rate",),
         help="계약 만료일의 현물환율을 입력하세요."
     )
+# Day count of the scheduled term, and a note when it runs past the years of the holiday table
+settlement_calendar = schedule.holiday_calendar()
+st.sidebar.caption(
+    f"계약 기간 {(end_date - start_date).days}일 (ACT/365 {float(schedule.day_count_fraction(start_date, end_date)):.4f}년)"
+)
+if not settlement_calendar.covers([start_date, end_date]):
+    st.sidebar.caption(
+        f"⚠️ 휴일표는 {settlement_calendar.first_year}~{settlement_calendar.last_year}년만 포함하므로, 그 밖의 날짜는 주말만 영업일에서 제외합니다."
+    )
 
 # 4. Settlement month/year and rate input fields
 st.sidebar.subheader("결산일자")
 
-# Function to get the last day of a month
-def get_last_day_of_month(year, month):
-    return calendar.monthrange(year, month)[1]
-
-# Modify settlement month/year to be selectable only within the contract period
-all_settlement_dates = []
-current_year = start_date.year
-current_month = start_date.month
-
-# Get the last day of the maturity month
-end_of_contract_month = date(end_date.year, end_date.month, get_last_day_of_month(end_date.year, end_date.month))
+# Settlement month/year is selectable only within the contract period
+today_position = contract_period_index.locate(f"{date.today().year}-{date.today().month:02d}")
 
-while date(current_year, current_month, 1) <= end_of_contract_month.replace(day=1):
-    last_day = get_last_day_of_month(current_year, current_month)
-    all_settlement_dates.append(date(current_year, current_month, last_day))
-    current_month += 1
-    if current_month > 12:
-        current_month = 1
-        current_year += 1
-
-date_options = [f"{d.year}년 {d.month}월" for d in all_settlement_dates]
-date_index = date_options.index(f"{date.today().year}년 {date.today().month}월") if f"{date.today().year}년 {date.today().month}월" in date_options else 0
-
-settlement_date = st.sidebar.selectbox(
+settlement_position = st.sidebar.selectbox(
     label="결산일자",
-    options=date_options,
-    index=date_index,
-    format_func=lambda d: d.replace("년", "년 ").replace("월", "월")
+    options=range(len(contract_period_index)),
+    index=today_position if today_position is not None else 0,
+    format_func=lambda i: contract_period_index.labels[i]
 )
-settlement_date_corrected = all_settlement_dates[date_options.index(settlement_date)]
+settlement_date_corrected = contract_period_index.closing_dates[settlement_position]
 
 st.sidebar.markdown(f"**최종 결산일:** **`{settlement_date_corrected.isoformat()}`**")
 
@@ -162,69 +943,82 @@ st.sidebar.markdown(
     "시나리오 분석을 위해 각 월말의 예상 통화선도환율을 입력하세요.",
     help="더블클릭하거나 탭하여 값을 수정할 수 있습니다."
 )
+# The curve inputs and the editor are filled in below, once the uploaded contract book (if any) is known
+curve_expander = st.sidebar.expander("선도환율 커브로 자동 입력")
+rates_editor_container = st.sidebar.container()
 
-current_year_scenario = start_date.year
-current_month_scenario = start_date.month
-
-# Create a list of all settlement months (excluding maturity month)
-all_settlement_months = []
-# Set initial value to 0.0
-initial_rate_for_hypo = 0.0
+# --- 외화환산데이터 입력 부분을 사이드바 맨 아래로 이동 ---
+st.sidebar.markdown("---")
+st.sidebar.subheader("외화환산손익 데이터")
+uploaded_files = st.sidebar.file_uploader(
+    "계정별원장(.xlsx, .xls) 업로드",
+    type=["xlsx", "xls"],
+    accept_multiple_files=True,
+    help="외화환산이익/손실을 포함하는 계정별원장 엑셀 파일을 업로드하세요. 월별·연도별 파일을 여러 개 올릴 수 있으며, 기간이 겹치는 월은 한 파일의 데이터만 사용합니다."
+)
+# Filled in at the end of the run if large uploads are still being parsed
+ingestion_container = st.sidebar.container()
+if not uploaded_files:
+    st.session_state.pop('ledger_jobs', None)
 
-while date(current_year_scenario, current_month_scenario, 1) <= end_of_contract_month.replace(day=1):
-    is_expiry_month_scenario = (current_year_scenario == end_date.year and current_month_scenario == end_date.month)
-    if not is_expiry_month_scenario:
-        month_key = f"{current_year_scenario}-{current_month_scenario:02d}"
+# --- 계약 포트폴리오 업로드 ---
+st.sidebar.markdown("---")
+st.sidebar.subheader("계약 포트폴리오")
+contract_book_file = st.sidebar.file_uploader(
+    "계약 목록(.csv, .xlsx) 업로드",
+    type=["csv", "xlsx", "xls"],
+    help="선도환거래종류, 거래금액($), 계약환율, 계약 시작일자, 기일물 열을 포함하는 계약 목록을 업로드하세요. '만기 시점 현물환율' 열은 선택 사항입니다."
+)
 
-        if month_key not in st.session_state.hypothetical_rates:
-            st.session_state.hypothetical_rates[month_key] = initial_rate_for_hypo
+df_book = None
+contract_book_error = None
+if contract_book_file is not None:
+    try:
+        df_book = get_contract_book(contract_book_file.getvalue(), contract_book_file.name, maturity_convention)
+        # Saved once per upload (by upload id), so reruns neither hash the book again nor write to the store
+        if ledger_store is not None and st.session_state.get('saved_book_file_id') != contract_book_file.file_id:
+            ledger_store.save_contract_book(
+                ledger.file_digest(contract_book_file.getvalue()), contract_book_file.name, df_book
+            )
+            st.session_state.saved_book_file_id = contract_book_file.file_id
+    except Exception as e:
+        contract_book_error = e
+elif ledger_store is not None:
+    # Offer the most recently saved book so it does not have to be uploaded in every session
+    stored_book = ledger_store.latest_contract_book()
+    if stored_book is not None and st.sidebar.checkbox(f"저장된 계약 목록 사용 ({stored_book[0]})", key="use_stored_book"):
+        df_book = portfolio.normalize_contract_book(stored_book[1], maturity_convention)
+
+# Every month shown in the editor: the contract's months (excluding the maturity month) and the uploaded book's months
+editor_month_labels = {
+    month_key: editor_label
+    for month_key, editor_label, is_expiry_month_scenario in zip(
+        contract_period_index.month_keys, contract_period_index.editor_labels, contract_period_index.is_expiry
+    )
+    if not is_expiry_month_scenario
+}
+curve_closing_dates = dict(zip(contract_period_index.month_keys, contract_period_index.closing_dates))
+if df_book is not None:
+    # Contracts in the uploaded book are valued with the same month-end forward rates
+    book_period_index = portfolio.book_periods(df_book)
+    for month_key, editor_label in zip(book_period_index.month_keys, book_period_index.editor_labels):
+        editor_month_labels.setdefault(month_key, editor_label)
+    curve_closing_dates.update(zip(book_period_index.month_keys, book_period_index.closing_dates))
 
-        all_settlement_months.append({
-            "결산일자": f"{current_year_scenario}년 {current_month_scenario}월말",
-            "예상 통화선도환율": st.session_state.hypothetical_rates.get(month_key),
-            "month_key": month_key # Key for internal use
-        })
-    current_month_scenario += 1
-    if current_month_scenario > 12:
-        current_month_scenario = 1
-        current_year_scenario += 1
+# Set initial value to 0.0
+initial_rate_for_hypo = 0.0
+for month_key in editor_month_labels:
+    if month_key not in st.session_state.hypothetical_rates:
+        st.session_state.hypothetical_rates[month_key] = initial_rate_for_hypo
 
-df_rates = pd.DataFrame(all_settlement_months)
+# Forward curve: spot + swap points per tenor bucket, interpolated to every month's closing date
+with curve_expander:
+    render_curve_inputs(start_spot_rate, curve_closing_dates)
 
 # Use Data Editor for rate input
-edited_df = st.sidebar.data_editor(
-    df_rates,
-    column_config={
-        "결산일자": st.column_config.TextColumn(
-            "결산일자",
-            disabled=True,
-        ),
-        "예상 통화선도환율": st.column_config.NumberColumn(
-            "예상 통화선도환율",
-            min_value=0.0,
-            format="%.2f",
-            help="이 달의 예상 통화선도환율을 입력하세요."
-        ),
-        "month_key": None
-    },
-    hide_index=True,
-    num_rows="fixed",
-)
-
-if not edited_df.empty:
-    for _, row in edited_df.iterrows():
-        updated_rate = row['예상 통화선도환율']
-        # Set the value to 0.0 if the user deletes it (it becomes None)
-        st.session_state.hypothetical_rates[row['month_key']] = updated_rate if updated_rate is not None else 0.0
+with rates_editor_container:
+    render_rates_editor(sorted(editor_month_labels.items()))
 
-# --- 외화환산데이터 입력 부분을 사이드바 맨 아래로 이동 ---
-st.sidebar.markdown("---")
-st.sidebar.subheader("외화환산손익 데이터")
-uploaded_file = st.sidebar.file_uploader(
-    "계정별원장(.xlsx, .xls) 업로드",
-    type=["xlsx", "xls"],
-    help="외화환산이익/손실을 포함하는 계정별원장 엑셀 파일을 업로드하세요."
-)
 
 # Main screen
 st.title("📈 파생상품 손익효과 분석 대시보드")
@@ -240,6 +1034,10 @@ if not start_spot_rate > 0:
     zero_value_errors.append("시작 시점 현물환율")
 if not end_spot_rate > 0:
     zero_value_errors.append("만기 시점 현물환율")
+st.session_state.contract_inputs_valid = contract_inputs_valid()
+
+# Ledger summary written to the close report (the memoized merge of the uploaded ledgers)
+report_ledger_summary = None
 
 if zero_value_errors:
     st.warning(f"다음 항목의 값을 0보다 크게 입력해주세요: {', '.join(zero_value_errors)}")
@@ -247,309 +1045,124 @@ if zero_value_errors:
 elif contract_rate > start_spot_rate:
     st.error("한미 금리차에 따른 스왑포인트를 음수로 가정하여, 계약환율은 계약 시작시점의 현물환율보다 낮아야합니다.")
 else:
-    settlement_year = settlement_date_corrected.year
-    settlement_month = settlement_date_corrected.month
-
-    is_expiry_month = (settlement_year == end_date.year and settlement_month == end_date.month)
-
-    # Transaction P&L is always calculated
-    if transaction_type == "선매도":
-        expiry_profit_loss = (contract_rate - end_spot_rate) * amount_usd
-    else: # Buy forward
-        expiry_profit_loss = (end_spot_rate - contract_rate) * amount_usd
-
-    # Valuation P&L is calculated only if it's not the maturity month
-    if not is_expiry_month:
-        # 월별 키를 생성할 때 `f"{...}-{...:02d}"` 형식으로 패딩을 추가하여 항상 두 자릿수로 만듭니다.
-        settlement_rate_key = f"{settlement_year}-{settlement_month:02d}"
-        settlement_forward_rate_for_calc = st.session_state.hypothetical_rates.get(settlement_rate_key, 0)
-
-        if settlement_forward_rate_for_calc <= 0:
-            st.warning("선택된 결산일자에 대한 '예상 통화선도환율'을 0보다 크게 입력해주세요.")
-        else:
-            if transaction_type == "선매도":
-                valuation_profit_loss = (contract_rate - settlement_forward_rate_for_calc) * amount_usd
-                valuation_rate_diff_text = f"{contract_rate:,.2f} - {settlement_forward_rate_for_calc:,.2f}"
-            else: # Buy forward
-                valuation_profit_loss = (settlement_forward_rate_for_calc - contract_rate) * amount_usd
-                valuation_rate_diff_text = f"{settlement_forward_rate_for_calc:,.2f} - {contract_rate:,.2f}"
-
-            # Display valuation P&L result
-            st.header(f"{settlement_month}월 결산시점 파생상품 평가손익 분석 결과")
-            st.write("선택된 결산일에 예상 환율을 기준으로 계산한 평가손익입니다.")
-            col_valuation_result, col_valuation_diff = st.columns(2)
-            with col_valuation_result:
-                if valuation_profit_loss >= 0:
-                    st.metric(label="파생상품 평가손익 (원)", value=f"{valuation_profit_loss:,.0f}원", delta="이익")
-                else:
-                    st.metric(label="파생상품 평가손익 (원)", value=f"{valuation_profit_loss:,.0f}원", delta="손실", delta_color="inverse")
-            with col_valuation_diff:
-                st.metric(label="환율 차이 (원)", value=f"{settlement_forward_rate_for_calc - contract_rate:,.2f}원")
-            st.markdown(f"**총 파생상품 평가손익:** ${amount_usd:,.0f} * ({valuation_rate_diff_text}) = {valuation_profit_loss:,.0f}원")
-
-    # Display transaction P&L result if it's the maturity month
-    else:
-        st.header(f"{settlement_month}월 결산시점 파생상품 거래손익 분석결과")
-        st.write("만기 시점의 현물환율을 기준으로 계산한 실제 손익입니다.")
-        col_expiry_result, col_expiry_diff = st.columns(2)
-        if transaction_type == "선매도":
-            expiry_rate_diff_text = f"{contract_rate:,.2f} - {end_spot_rate:,.2f}"
-        else: # Buy forward
-            expiry_rate_diff_text = f"{end_spot_rate:,.2f} - {contract_rate:,.2f}"
-        with col_expiry_result:
-            if expiry_profit_loss >= 0:
-                st.metric(label="파생상품 거래손익 (원)", value=f"{expiry_profit_loss:,.0f}원", delta="이익")
-            else:
-                st.metric(label="파생상품 거래손익 (원)", value=f"{expiry_profit_loss:,.0f}원", delta="손실", delta_color="inverse")
-        with col_expiry_diff:
-            st.metric(label="환율 차이 (원)", value=f"{end_spot_rate - contract_rate:,.2f}원")
-        st.markdown(f"**총 파생상품 거래손익:** ${amount_usd:,.0f} * ({expiry_rate_diff_text}) = {expiry_profit_loss:,.0f}원")
+    render_contract_result(contract_period_index, settlement_position)
 
     # --- Process uploaded file for FX P&L and new FX rate chart
     st.markdown("---")
     st.subheader("외화환산손익 데이터 분석")
+    ledger_summary = None
 
-    monthly_fx_pl = {}
-    df_ledger = pd.DataFrame() # Initialize an empty DataFrame
-
-    # 생성될 모든 월 문자열의 순서 리스트를 미리 생성 (정확한 차트 정렬을 위함)
-    ordered_month_strings = []
-    temp_year, temp_month = start_date.year, start_date.month
-    while date(temp_year, temp_month, 1) <= end_of_contract_month.replace(day=1):
-        ordered_month_strings.append(f"{temp_year}년 {temp_month}월")
-        temp_month += 1
-        if temp_month > 12:
-            temp_month = 1
-            temp_year += 1
+    # 차트 정렬 순서는 공유 기간 인덱스의 월 문자열을 그대로 사용
+    ordered_month_strings = list(contract_period_index.labels)
 
-    if uploaded_file is not None:
+    if uploaded_files:
         try:
-            # Step 1: Find the correct header row
-            required_columns_strict = ['회계일', '계정명', '차변', '대변', '환율', '거래환종']
-            header_row = None
-
-            # Read the file with no header to inspect the data
-            df_temp = pd.read_excel(uploaded_file, header=None, nrows=50)
-
-            # Find the row that contains all required columns (case-insensitive and with stripping)
-            for i in range(len(df_temp)):
-                row_values = [str(x).strip() for x in df_temp.iloc[i]]
-                found_all = all(col.lower() in [val.lower() for val in row_values] for col in required_columns_strict)
-                if found_all:
-                    header_row = i
-                    break
-
-            if header_row is None:
+            # Parse each workbook once per file content; reruns and newly added files reuse the cached aggregates.
+            # Very large workbooks are streamed so they are never loaded as a whole.
+            try:
+                with instrumentation.stage('ledger summary') as record:
+                    ledger_summary = load_ledger_summary(uploaded_files)
+                    record.rows = ledger_summary.row_count if ledger_summary is not None else None
+                report_ledger_summary = ledger_summary
+            except ledger.LedgerHeaderError:
                 st.error("업로드한 파일에서 '회계일', '계정명', '차변', '대변', '환율', '거래환종' 열을 찾을 수 없습니다. 열 이름의 철자를 확인하거나, 첫 번째 행이 아닌 경우에도 올바르게 인식되도록 수정했습니다.")
                 st.stop()
-
-            # Step 2: Read the full file using the identified header row
-            df_ledger = pd.read_excel(uploaded_file, header=header_row)
-            df_ledger.columns = [col.strip() for col in df_ledger.columns]
-
-            # Re-map columns to the expected names
-            df_ledger.rename(columns={
-                '회계일': '회계일',
-                '계정명': '계정명',
-                '차변': '차변',
-                '대변': '대변',
-                '환율': '환율',
-                '거래환종': '거래환종'
-            }, inplace=True)
-
-            # Convert columns to numeric, coercing errors to NaN
-            df_ledger['차변'] = pd.to_numeric(df_ledger['차변'], errors='coerce').fillna(0)
-            df_ledger['대변'] = pd.to_numeric(df_ledger['대변'], errors='coerce').fillna(0)
-            df_ledger['환율'] = pd.to_numeric(df_ledger['환율'], errors='coerce').fillna(0)
-
-            # Convert '회계일' to datetime
-            df_ledger['회계일'] = pd.to_datetime(df_ledger['회계일'])
-
-            # NEW: Filter out rows that contain "월계" or "누계" in the '계정명' column
-            df_ledger = df_ledger[~df_ledger['계정명'].str.contains('월계|누계', case=False, na=False)]
-
-            # Calculate FX P&L by checking if the account name CONTAINS the keywords
-            df_ledger['fx_pl'] = 0
-            df_ledger.loc[df_ledger['계정명'].str.contains('외화환산이익', case=False, na=False), 'fx_pl'] = df_ledger['대변']
-            df_ledger.loc[df_ledger['계정명'].str.contains('외화환산손실', case=False, na=False), 'fx_pl'] = -df_ledger['차변']
-
-            df_ledger['month_key'] = df_ledger['회계일'].dt.strftime('%Y-%m')
-            monthly_fx_pl = df_ledger.groupby('month_key')['fx_pl'].sum().to_dict()
-
-            # Display FX P&L metric here
-            if f"{settlement_year}-{settlement_month:02d}" in monthly_fx_pl:
-                selected_month_fx_pl = monthly_fx_pl[f"{settlement_year}-{settlement_month:02d}"]
-                if selected_month_fx_pl >= 0:
-                    st.metric(label="외화환산손익 (원)", value=f"{selected_month_fx_pl:,.0f}원", delta="이익")
-                else:
-                    st.metric(label="외화환산손익 (원)", value=f"{selected_month_fx_pl:,.0f}원", delta="손실", delta_color="inverse")
-            else:
-                st.info("선택된 결산일에 해당하는 외화환산손익 데이터가 업로드된 파일에 없습니다.")
-
         except Exception as e:
             st.error(f"파일을 처리하는 중 오류가 발생했습니다. 파일 형식이 올바른지 확인해주세요. 오류 메시지: {e}")
             st.stop()
-    else:
-        st.info("왼쪽 사이드바에서 계정별원장 파일을 업로드해 주세요.")
+
+    render_ledger_analysis(ledger_summary, contract_period_index.month_keys[settlement_position])
 
     # --- Display P&L scenario with a chart
     st.markdown("---")
-    st.subheader("📊 파생상품 및 외화평가 기간별 총 손익 시나리오")
-
-    # Create DataFrame for scenario analysis
-    scenario_data = []
-    current_year_chart = start_date.year
-    current_month_chart = start_date.month
-
-    while date(current_year_chart, current_month_chart, 1) <= end_of_contract_month.replace(day=1):
-        month_key_chart = f"{current_year_chart}-{current_month_chart:02d}"
-
-        # Calculate Derivative P&L
-        is_expiry_month_chart = (current_year_chart == end_date.year and current_month_chart == end_date.month)
-        derivative_pl = 0
-        if is_expiry_month_chart:
-            derivative_pl = expiry_profit_loss
-        else:
-            # 수정된 부분: 이제 예상 통화선도환율을 Data Editor에서 가져옵니다.
-            hypothetical_forward_rate = st.session_state.hypothetical_rates.get(month_key_chart)
-            if hypothetical_forward_rate is None:
-                hypothetical_forward_rate = initial_rate_for_hypo
-
-            if transaction_type == "선매도":
-                derivative_pl = (contract_rate - hypothetical_forward_rate) * amount_usd
-            else: # Buy forward
-                derivative_pl = (hypothetical_forward_rate - contract_rate) * amount_usd
-
-        # Get FX P&L from uploaded file data
-        fx_pl = monthly_fx_pl.get(f"{current_year_chart}-{current_month_chart:02d}", 0)
-
-        scenario_data.append({
-            "결산연월": f"{current_year_chart}년 {current_month_chart}월",
-            "파생상품 손익 (백만원)": derivative_pl / 1_000_000,
-            "외화환산손익 (백만원)": fx_pl / 1_000_000
-        })
-
-        current_month_chart += 1
-        if current_month_chart > 12:
-            current_month_chart = 1
-            current_year_chart += 1
-
-    # Create DataFrame and melt for grouped bar chart
-    df_scenario = pd.DataFrame(scenario_data)
-    df_melted = pd.melt(df_scenario, id_vars=['결산연월'],
-                                     value_vars=['파생상품 손익 (백만원)', '외화환산손익 (백만원)'],
-                                     var_name='손익 종류', value_name='손익 (백만원)')
-
-    # Generate and display Altair chart
-    st.write("각 월에 대한 파생상품 손익과 업로드된 파일의 외화환산손익을 비교합니다.")
-
-    # Dynamically set Y-axis domain to ensure bars are always visible
-    min_pl = df_melted['손익 (백만원)'].min()
-    max_pl = df_melted['손익 (백만원)'].max()
-
-    buffer = 1.2
-    min_domain = -10.0
-    max_domain = 10.0
-
-    if not math.isclose(min_pl, 0.0) or not math.isclose(max_pl, 0.0):
-        abs_max = max(abs(min_pl), abs(max_pl))
-        min_domain = -abs_max * buffer
-        max_domain = abs_max * buffer
-
-    chart_domain = [min_domain, max_domain]
-
-    # Calculate dynamic chart width for horizontal scrolling if tenor is > 1 year
-    num_months = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month) + 1
-    chart_width = max(600, num_months * 80) # Use a minimum width, then scale up
-
-    # --- 그룹 막대 차트로 변경하여 모든 월이 표시되도록 수정
-    bar_chart = alt.Chart(df_melted).mark_bar(size=20).encode(
-        # Y축
-        y=alt.Y('손익 (백만원)', axis=alt.Axis(title='손익 (백만원)', format=',.2f'), scale=alt.Scale(domain=chart_domain)),
-        # 그룹을 위한 X축: 결산연월 (순서 강제 적용)
-        x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings),
-        # 그룹 내 막대 위치를 위한 X축 오프셋
-        xOffset=alt.XOffset('손익 종류:N'),
-        # 색상
-        color=alt.Color('손익 종류', legend=alt.Legend(title="손익 종류")),
-        # 툴팁
-        tooltip=[
-            alt.Tooltip('결산연월', title='결산연월'),
-            alt.Tooltip('손익 종류', title='손익 종류'),
-            alt.Tooltip('손익 (백만원)', title='손익 (백만원)', format=',.2f')
-        ]
-    ).properties(
-        title='월별 파생상품 및 외화평가 손익 시나리오',
-        width=chart_width,
-        height=400
-    ).interactive()
-
-    st.altair_chart(bar_chart)
+    render_scenario(contract_period_index, start_date, contract_months, maturity_convention, ledger_summary)
 
     # --- NEW: 환율 꺾은선 그래프 추가 (Add FX Rate Line Chart) ---
     st.markdown("---")
-    st.subheader("📈 외화평가 시점별 환율 변동 추이")
-
-    # If a file is uploaded, process it
-    if uploaded_file is not None and not df_ledger.empty:
-        df_usd_rates = df_ledger[df_ledger['거래환종'].str.upper() == 'USD'].copy()
-
-        # [수정] 날짜 형식 불일치 문제 해결
-        # 월말 데이터만 필터링
-        df_monthly_rates_from_ledger = df_usd_rates[df_usd_rates['회계일'].dt.is_month_end].copy()
-        
-        # '결산연월' 컬럼을 'ordered_month_strings'와 동일한 형식으로 직접 생성
-        df_monthly_rates_from_ledger['결산연월'] = df_monthly_rates_from_ledger['회계일'].dt.strftime('%Y년 %-m월')
-
-        # 그룹핑 및 환율 데이터 요약
-        df_monthly_rates_from_ledger = df_monthly_rates_from_ledger.groupby('결산연월')['환율'].max().reset_index()
+    render_rate_trend(ordered_month_strings, ledger_summary)
 
-        df_monthly_rates_from_ledger.rename(columns={'환율': '외화평가 환율'}, inplace=True)
-
-        # Create a single DataFrame for the chart based on the canonical month list
-        df_rates_for_chart = pd.DataFrame({'결산연월': ordered_month_strings})
-        df_rates_for_chart['계약환율'] = contract_rate
-
-        # Merge the FX valuation rates into the main DataFrame
-        df_rates_for_chart = pd.merge(df_rates_for_chart, df_monthly_rates_from_ledger,
-                                       on='결산연월', how='left')
-
-        # Melt the DataFrame to prepare for plotting multiple lines
-        df_rates_for_chart_melted = pd.melt(df_rates_for_chart,
-                                             id_vars=['결산연월'],
-                                             value_vars=['계약환율', '외화평가 환율'],
-                                             var_name='환율 종류',
-                                             value_name='환율')
-
-        # Drop rows where '환율' is NaN, which happens if there's no data for a month
-        df_rates_for_chart_melted.dropna(subset=['환율'], inplace=True)
-
-        # Calculate a dynamic domain for the line chart's Y-axis to improve visibility
-        min_rate = df_rates_for_chart_melted['환율'].min()
-        max_rate = df_rates_for_chart_melted['환율'].max()
+# --- Portfolio P&L scenario: every contract of the uploaded book valued in one pass
+if contract_book_file is not None or df_book is not None:
+    st.markdown("---")
+    st.subheader("📦 계약 포트폴리오 기간별 총 손익 시나리오")
 
-        if math.isclose(min_rate, max_rate):
-            buffer = min_rate * 0.05
-        else:
-            buffer = (max_rate - min_rate) * 0.1
-
-        rate_domain = [min_rate - buffer, max_rate + buffer]
-
-        # Generate Altair line chart
-        line_chart = alt.Chart(df_rates_for_chart_melted).mark_line(point=True).encode(
-            x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings),
-            y=alt.Y('환율', axis=alt.Axis(title='환율', format=',.2f'), scale=alt.Scale(domain=rate_domain)),
-            color=alt.Color('환율 종류', legend=alt.Legend(title="환율 종류")),
-            tooltip=[
-                alt.Tooltip('결산연월', title='결산연월'),
-                alt.Tooltip('환율 종류', title='환율 종류'),
-                alt.Tooltip('환율', title='환율', format=',.2f')
-            ]
-        ).properties(
-            title='계약환율 대비 외화평가 시점별 환율 변동',
-            width=800,
-            height=400
-        ).interactive()
-        st.altair_chart(line_chart)
+    if df_book is None:
+        st.error(f"계약 목록 파일을 처리하는 중 오류가 발생했습니다. 파일 형식이 올바른지 확인해주세요. 오류 메시지: {contract_book_error}")
     else:
-        st.info("왼쪽 사이드바에서 계정별원장 파일을 업로드해 주세요.")
+        book_ledger_summary = None
+        if uploaded_files:
+            try:
+                book_ledger_summary = load_ledger_summary(uploaded_files)
+                if book_ledger_summary is not None:
+                    report_ledger_summary = book_ledger_summary
+                elif ledger_ingesting():
+                    st.info("계정별원장을 처리하는 중이어서 외화환산손익 없이 표시합니다. 처리가 끝나면 자동으로 반영됩니다.")
+            except Exception:
+                st.warning("계정별원장 파일을 처리할 수 없어 외화환산손익 없이 표시합니다.")
+        render_portfolio(df_book, book_ledger_summary)
+
+# --- Background ledger parses: progress in the sidebar until the page has collected the summaries
+if ledger_ingesting():
+    with ingestion_container:
+        render_ingestion_progress()
+
+# --- Close report: the scenario tables of the drawn sections, exported without recomputation
+report_sections = [
+    (label, table_name)
+    for fragment_key, table_name, label in (("scenario", "contract", "단일 계약"), ("portfolio", "book", "계약 포트폴리오"))
+    if fragment_key in st.session_state.rendered_fragments
+]
+if report_sections:
+    st.markdown("---")
+    st.subheader("📥 결산 보고서")
+    st.write("표시 중인 시나리오의 월별 손익, 계약별 손익과 월말 환율을 엑셀 파일로 내려받습니다.")
+    # Fragment reruns patch or replace the session's tables, so they are looked up when the button is clicked
+    scenario_tables = st.session_state.scenario_tables
+
+    # Function to write the report workbook (runs on click, outside the script run)
+    def build_close_report():
+        sections = [(label, scenario_tables[name]) for label, name in report_sections if name in scenario_tables]
+        return report.close_report_bytes(sections, report_ledger_summary)
+
+    st.download_button(
+        label="결산 보고서 다운로드 (.xlsx)",
+        data=build_close_report,
+        file_name=f"결산보고서_{date.today():%Y%m%d}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore",
+    )
+
+# --- Debug panel (?debug=1): stages of this rerun, also written to the log / STAGE_LOG_PATH
+if debug_mode:
+    st.markdown("---")
+    with st.expander("🔧 단계별 실행 시간 및 메모리", expanded=False):
+        df_stages = stage_run.table()
+        df_stages['peak_mb'] = pd.to_numeric(df_stages['peak_bytes']) / (1024 * 1024)
+        st.caption(f"실행 ID {stage_run.run_id} · 총 {len(df_stages)}단계 · 캐시에서 읽은 단계는 표시되지 않습니다.")
+        st.dataframe(
+            df_stages[['stage', 'seconds', 'peak_mb', 'rows']],
+            column_config={
+                'stage': '단계',
+                'seconds': st.column_config.NumberColumn('실행 시간 (초)', format="%.4f"),
+                'peak_mb': st.column_config.NumberColumn('최대 메모리 (MB)', format="%.2f"),
+                'rows': st.column_config.NumberColumn('행 수', format="%d"),
+            },
+            hide_index=True,
+        )
+
+        # Resident size of the parsed ledgers kept in the shared cache (typed columns only)
+        df_cached = get_ledger_cache().memory_report()
+        if not df_cached.empty:
+            df_cached['mb'] = df_cached['bytes'] / (1024 * 1024)
+            df_cached['bytes_per_row'] = df_cached['bytes'] / df_cached['rows'].clip(lower=1)
+            st.caption("메모리에 보관된 계정별원장")
+            st.dataframe(
+                df_cached[['digest', 'rows', 'mb', 'bytes_per_row']],
+                column_config={
+                    'digest': '파일',
+                    'rows': st.column_config.NumberColumn('행 수', format="%d"),
+                    'mb': st.column_config.NumberColumn('메모리 (MB)', format="%.2f"),
+                    'bytes_per_row': st.column_config.NumberColumn('행당 바이트', format="%.1f"),
+                },
+                hide_index=True,
+            )
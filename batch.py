@@ -0,0 +1,192 @@
+"""
+Headless month-end close: monthly P&L tables for many entities without the dashboard.
+
+The input directory holds one subdirectory per entity with its 계정별원장 workbooks and,
+optionally, a contract book named contracts.csv / contracts.xlsx (or 계약목록.*):
+
+    close_input/
+        entity_a/ ledger_2025.xlsx  ledger_2026.xlsx  contracts.csv
+        entity_b/ ledger.xlsx
+
+Run from the repository root:
+
+    python batch.py close_input --forward-rates forward_rates.csv --output close_output
+
+Entities are processed in parallel in a process pool. Each writes <entity>_monthly_pl.csv with
+the monthly 평가손익, 거래손익, 파생상품 손익, 외화환산손익 and 순손익 in 원, computed with the same
+ledger, portfolio and periods functions the dashboard uses, so the numbers match what it shows.
+Month-end forward rates are read from a CSV with 'month_key' (YYYY-MM) and 'rate' columns and/or
+the store named by --store (LEDGER_STORE_PATH by default); the CSV wins where both have a month.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import ledger
+import periods
+import portfolio
+import store
+
+# File stems recognized as an entity's contract book (any other workbook is a ledger)
+CONTRACT_BOOK_STEMS = ('contracts', '계약목록')
+
+LEDGER_EXTENSIONS = ('.xlsx', '.xls')
+BOOK_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Columns of the per-entity output, in 원
+PL_COLUMNS = ['평가손익', '거래손익', '파생상품 손익', '외화환산손익', '순손익']
+
+
+@dataclass
+class Entity:
+    """The input files of one entity."""
+    name: str
+    ledger_paths: list = field(default_factory=list)
+    book_path: str = None
+
+
+@dataclass
+class CloseResult:
+    """The monthly P&L table of one entity, or the error that stopped it."""
+    name: str
+    table: pd.DataFrame = None
+    missing_rate_months: list = field(default_factory=list)
+    error: str = None
+
+
+def discover_entities(input_dir):
+    """Returns an Entity for every subdirectory of `input_dir` that holds a ledger or a contract book."""
+    entities = []
+    for name in sorted(os.listdir(input_dir)):
+        entity_dir = os.path.join(input_dir, name)
+        if not os.path.isdir(entity_dir):
+            continue
+        entity = Entity(name=name)
+        for filename in sorted(os.listdir(entity_dir)):
+            # Skip Excel's lock files of workbooks that are open
+            if filename.startswith('~$'):
+                continue
+            stem, extension = os.path.splitext(filename)
+            path = os.path.join(entity_dir, filename)
+            if stem.lower() in CONTRACT_BOOK_STEMS and extension.lower() in BOOK_EXTENSIONS:
+                entity.book_path = path
+            elif extension.lower() in LEDGER_EXTENSIONS:
+                entity.ledger_paths.append(path)
+        if entity.ledger_paths or entity.book_path:
+            entities.append(entity)
+    return entities
+
+
+def load_forward_rates(rates_path=None, store_path=None):
+    """Returns the month-end forward rates ({'YYYY-MM': rate}) of the store and/or the CSV file."""
+    forward_rates = {}
+    if store_path:
+        ledger_store = store.LedgerStore(store_path)
+        try:
+            forward_rates.update(ledger_store.load_forward_rates())
+        finally:
+            ledger_store.close()
+    if rates_path:
+        df_rates = pd.read_csv(rates_path, dtype={'month_key': str})
+        forward_rates.update(zip(df_rates['month_key'].str.strip(), df_rates['rate'].astype(float)))
+    return forward_rates
+
+
+def monthly_pl(df_book, ledger_summary, forward_rates):
+    """
+    Returns the monthly P&L table of a normalized contract book (or None) and a LedgerSummary (or None),
+    over the months of the book and the ledgers, indexed by 'YYYY-MM'.
+    Also returns the months in which a contract is valued without an entered forward rate.
+    """
+    monthly_fx_pl = ledger_summary.monthly_fx_pl if ledger_summary is not None else {}
+    ordinals = [periods.month_key_to_ordinal(month_key) for month_key in monthly_fx_pl]
+    if df_book is not None and len(df_book):
+        ordinals += [int(df_book['start_ordinal'].min()), int(df_book['expiry_ordinal'].max())]
+    if not ordinals:
+        return pd.DataFrame(columns=PL_COLUMNS, index=pd.Index([], name='month_key')), []
+
+    period_index = periods.period_range(min(ordinals), max(ordinals))
+    if df_book is not None and len(df_book):
+        # The dashboard's scenario table, so the monthly sums are added in the same order
+        totals = portfolio.ScenarioTable(df_book, period_index, forward_rates).monthly_totals()
+        _, slope = portfolio.linear_exposure(df_book, period_index)
+        missing_rate_months = [
+            month_key for month_key, exposure in zip(period_index.month_keys, slope)
+            if exposure != 0 and not forward_rates.get(month_key, 0) > 0
+        ]
+    else:
+        totals = pd.DataFrame(0.0, columns=PL_COLUMNS[:3], index=pd.Index(period_index.month_keys, name='month_key'))
+        missing_rate_months = []
+    return portfolio.monthly_pl_table(totals, monthly_fx_pl)[PL_COLUMNS], missing_rate_months
+
+
+def close_entity(entity, forward_rates):
+    """Parses the entity's ledgers and contract book and returns its CloseResult (run in a worker process)."""
+    try:
+        summaries = []
+        for path in entity.ledger_paths:
+            with open(path, 'rb') as f:
+                summaries.append(ledger.stream_ledger_summary(f.read()))
+        ledger_summary = ledger.merge_summaries(summaries) if summaries else None
+
+        df_book = None
+        if entity.book_path:
+            with open(entity.book_path, 'rb') as f:
+                df_book = portfolio.load_contract_book(f.read(), entity.book_path)
+
+        table, missing_rate_months = monthly_pl(df_book, ledger_summary, forward_rates)
+        return CloseResult(name=entity.name, table=table, missing_rate_months=missing_rate_months)
+    except Exception as e:
+        # Any unreadable input (missing columns, corrupt or legacy workbooks, ...) fails only this entity
+        return CloseResult(name=entity.name, error=f"{type(e).__name__}: {e}")
+
+
+def run_close(entities, forward_rates, output_dir, max_workers=None):
+    """Closes every entity in a process pool, writes <entity>_monthly_pl.csv files and returns the results."""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(len(entities), max_workers or os.cpu_count() or 1))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(close_entity, entities, [forward_rates] * len(entities)):
+            if result.table is not None:
+                # utf-8-sig so Excel opens the Korean headers correctly
+                result.table.to_csv(os.path.join(output_dir, f"{result.name}_monthly_pl.csv"), encoding='utf-8-sig')
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input_dir', help='directory with one subdirectory per entity')
+    parser.add_argument('--output', default='close_output', help='directory the monthly P&L tables are written to')
+    parser.add_argument('--forward-rates', help="CSV of month-end forward rates ('month_key', 'rate')")
+    parser.add_argument('--store', default=os.environ.get('LEDGER_STORE_PATH'),
+                        help='SQLite store whose saved forward rates are used (default: LEDGER_STORE_PATH)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    entities = discover_entities(args.input_dir)
+    if not entities:
+        print(f'no entity directories with ledgers or contract books in {args.input_dir}', file=sys.stderr)
+        return 1
+    forward_rates = load_forward_rates(args.forward_rates, args.store)
+
+    failed = False
+    for result in run_close(entities, forward_rates, args.output, args.workers):
+        if result.error:
+            failed = True
+            print(f'{result.name:30s} FAILED  {result.error}', file=sys.stderr)
+            continue
+        print(f'{result.name:30s} {len(result.table):4d} months  순손익 {result.table["순손익"].sum():,.0f}원')
+        if result.missing_rate_months:
+            print(f'{"":30s} no forward rate for {", ".join(result.missing_rate_months)} (valued at a rate of 0)',
+                  file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Synthetic 계정별원장 workbooks and contract books for the benchmark suite."""
+import calendar
+import io
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# Account names posted in the synthetic ledger, with their relative frequency
+ACCOUNT_WEIGHTS = {
+    '외화환산이익': 0.12,
+    '외화환산손실': 0.12,
+    '외환차익': 0.05,
+    '외환차손': 0.05,
+    '외화예금': 0.2,
+    '외상매출금': 0.2,
+    '외상매입금': 0.16,
+    '파생상품평가이익': 0.05,
+    '파생상품평가손실': 0.05,
+}
+
+CURRENCY_WEIGHTS = {'USD': 0.6, 'EUR': 0.2, 'JPY': 0.1, 'CNY': 0.1}
+
+BASE_RATES = {'USD': 1350.0, 'EUR': 1470.0, 'JPY': 9.1, 'CNY': 187.0}
+
+
+def ledger_rows(rows, start=date(2025, 1, 1), months=12, seed=0):
+    """
+    Returns a DataFrame of `rows` synthetic postings spread over `months` months from `start`.
+    Roughly a third of the postings fall on the calendar month-end, as valuation entries do.
+    """
+    rng = np.random.default_rng(seed)
+    first = start.year * 12 + start.month - 1
+    month_ordinals = first + rng.integers(0, months, rows)
+    years, month_numbers = month_ordinals // 12, month_ordinals % 12 + 1
+    last_days = np.array([calendar.monthrange(y, m)[1] for y, m in zip(years, month_numbers)])
+    days = np.where(rng.random(rows) < 0.35, last_days, (rng.random(rows) * last_days).astype(int) + 1)
+    posted_on = pd.to_datetime(pd.DataFrame({'year': years, 'month': month_numbers, 'day': days}))
+
+    accounts = rng.choice(list(ACCOUNT_WEIGHTS), rows, p=list(ACCOUNT_WEIGHTS.values()))
+    currencies = rng.choice(list(CURRENCY_WEIGHTS), rows, p=list(CURRENCY_WEIGHTS.values()))
+    base = np.array([BASE_RATES[c] for c in currencies])
+    amounts = rng.integers(1, 5_000_000, rows)
+    is_debit = rng.random(rows) < 0.5
+
+    df = pd.DataFrame({
+        '회계일': posted_on,
+        '계정명': accounts,
+        '차변': np.where(is_debit, amounts, 0),
+        '대변': np.where(is_debit, 0, amounts),
+        '환율': np.round(base * (1 + rng.normal(0, 0.02, rows)), 2),
+        '거래환종': currencies,
+        '적요': 'synthetic',
+    })
+    return df.sort_values('회계일', kind='stable').reset_index(drop=True)
+
+
+def ledger_workbook_bytes(rows, start=date(2025, 1, 1), months=12, header_offset=3, seed=0):
+    """
+    Writes a synthetic 계정별원장 workbook the way the ERP exports it: `header_offset` title
+    rows above the header, and 월계/누계 subtotal rows after every month, with mixed 거래환종.
+    """
+    df = ledger_rows(rows, start, months, seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('계정별원장')
+    sheet.append(['계정별원장'])
+    for i in range(1, header_offset):
+        sheet.append([f'조회조건 {i}'] if i % 2 else [])
+    sheet.append(list(df.columns))
+
+    month_keys = df['회계일'].dt.strftime('%Y-%m').to_numpy()
+    cumulative_debit = cumulative_credit = 0
+    month_debit = month_credit = 0
+    previous_key = month_keys[0] if len(df) else None
+    for month_key, row in zip(month_keys, df.itertuples(index=False)):
+        if month_key != previous_key:
+            sheet.append([None, '월계', month_debit, month_credit, None, None, None])
+            sheet.append([None, '누계', cumulative_debit, cumulative_credit, None, None, None])
+            month_debit = month_credit = 0
+            previous_key = month_key
+        sheet.append([row[0].to_pydatetime(), row[1], int(row[2]), int(row[3]), float(row[4]), row[5], row[6]])
+        month_debit += int(row[2])
+        month_credit += int(row[3])
+        cumulative_debit += int(row[2])
+        cumulative_credit += int(row[3])
+    if len(df):
+        sheet.append([None, '월계', month_debit, month_credit, None, None, None])
+        sheet.append([None, '누계', cumulative_debit, cumulative_credit, None, None, None])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def contract_book(contracts, start=date(2025, 1, 1), seed=0):
+    """Returns a raw contract book with the columns of an uploaded 계약 목록."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '선도환거래종류': rng.choice(['선매도', '선매수'], contracts),
+        '거래금액($)': rng.integers(1, 500, contracts) * 10_000.0,
+        '계약환율': np.round(1300 + rng.random(contracts) * 80, 2),
+        '계약 시작일자': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, 365, contracts), unit='D'),
+        '기일물': rng.choice(['1개월물', '3개월물', '6개월물', '1년물', '2년물', '3년물'], contracts),
+    })
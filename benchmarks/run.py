@@ -0,0 +1,286 @@
+"""
+Synthetic-data benchmark suite for ledger ingestion, the P&L engine and dashboard reruns.
+
+Run from the repository root:
+
+    python -m benchmarks.run --rows 10000 100000 1000000 --output bench.json
+    python -m benchmarks.run --rows 10000 --compare baseline.json
+
+Every stage is timed in isolation on generated inputs; the best and median of `--repeat` runs are
+recorded together with the environment and git revision, so results from different commits can be
+compared. The resident size of the normalized ledger is recorded as the 'ledger_memory' stage.
+With --compare, stages slower (or larger) than the baseline by more than --threshold are reported
+and the command exits with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import chartdata  # noqa: E402
+import charts  # noqa: E402
+import ledger  # noqa: E402
+import portfolio  # noqa: E402
+from benchmarks import generators  # noqa: E402
+
+DEFAULT_ROWS = (10_000, 100_000)
+DEFAULT_CONTRACTS = (1, 1_000, 10_000)
+
+# Ledgers larger than this are not driven through the headless app rerun by default
+DEFAULT_E2E_MAX_ROWS = 100_000
+
+# Sidebar inputs entered before the timed app runs, so the full dashboard is rendered
+CONTRACT_INPUTS = {"거래금액($)": 1_000_000.0, "계약환율": 1300.0, "시작 시점 현물환율": 1310.0, "만기 시점 현물환율": 1350.0}
+
+# Relative slowdown reported as a regression by --compare
+DEFAULT_THRESHOLD = 1.2
+
+
+def time_stage(func, repeat):
+    """Runs `func` `repeat` times and returns (best seconds, median seconds, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings), result
+
+
+def environment():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def workbook_path(data_dir, rows, seed):
+    """Returns the path of a generated ledger workbook, writing it only if it does not exist yet."""
+    path = os.path.join(data_dir, f'ledger_{rows}_{seed}.xlsx')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(generators.ledger_workbook_bytes(rows, seed=seed))
+    return path
+
+
+def bench_ledger(rows, file_path, repeat):
+    """Times each ledger ingestion stage on one generated workbook."""
+    with open(file_path, 'rb') as f:
+        file_bytes = f.read()
+
+    results = []
+
+    def record(stage, func):
+        best, median, result = time_stage(func, repeat)
+        results.append({'stage': stage, 'rows': rows, 'seconds_best': best, 'seconds_median': median})
+        return result
+
+    header_row = record('header_detection', lambda: ledger.detect_header_row(file_bytes))
+    df_raw = record('read_excel', lambda: ledger.read_ledger_frame(file_bytes, header_row))
+    df_coerced = record('coercion', lambda: ledger.coerce_ledger(df_raw.copy()))
+    df_labeled = record('account_classification', lambda: ledger.label_accounts(df_coerced.copy()))
+    df_ledger = record('fx_pl_derivation', lambda: ledger.derive_fx_pl(df_labeled.copy()))
+    footprint = ledger.memory_footprint(df_ledger)
+    results.append({'stage': 'ledger_memory', 'rows': rows, 'bytes': int(footprint['bytes'].iloc[-1])})
+    record('monthly_groupby', lambda: ledger.summarize_ledger(df_ledger))
+    record('streaming_summary', lambda: ledger.stream_ledger_summary(file_bytes))
+    return results
+
+
+def bench_portfolio(contracts, repeat, seed):
+    """
+    Times the scenario table, a one-month rate edit patched into it, its chart spec, the expiry-month
+    breakdown chart and a one-month drill-down for a generated contract book.
+    """
+    df_book = portfolio.normalize_contract_book(generators.contract_book(contracts, seed=seed))
+    period_index = portfolio.book_periods(df_book)
+    forward_rates = dict(zip(period_index.month_keys, np.linspace(1320.0, 1380.0, len(period_index))))
+
+    results = []
+
+    def record(stage, func):
+        best, median, result = time_stage(func, repeat)
+        results.append({'stage': stage, 'contracts': contracts, 'seconds_best': best, 'seconds_median': median})
+        return result
+
+    df_totals = record(
+        'scenario_table',
+        lambda: portfolio.compute_portfolio_pl(df_book, period_index, forward_rates).monthly_totals(),
+    )
+
+    table = portfolio.ScenarioTable(df_book, period_index, forward_rates)
+    edited_rates = dict(forward_rates)
+
+    def patch_one_month():
+        edited_rates[period_index.month_keys[0]] += 0.01
+        table.update(edited_rates)
+        return table.monthly_totals()
+
+    record('scenario_patch', patch_one_month)
+
+    df_scenario = pd.DataFrame({
+        "결산연월": list(period_index.labels),
+        "평가손익 (백만원)": df_totals['평가손익'].to_numpy() / 1_000_000,
+        "거래손익 (백만원)": df_totals['거래손익'].to_numpy() / 1_000_000,
+    })
+    record(
+        'altair_spec',
+        lambda: charts.build_scenario_chart(df_scenario, list(period_index.labels), 'benchmark').to_dict(),
+    )
+
+    def breakdown_spec():
+        df_breakdown = chartdata.breakdown_frame(table, '만기연월', '파생상품 손익', '월')
+        return charts.build_breakdown_chart(
+            df_breakdown, list(period_index.labels), 'benchmark', '만기연월'
+        ).to_dict()
+
+    record('breakdown_spec', breakdown_spec)
+    record('drill_down', lambda: chartdata.drill_down(table, 0, '월', '만기연월', None))
+    return results
+
+
+def bench_app_rerun(rows, file_path, repeat):
+    """
+    Times the headless dashboard: a cold run with empty caches (the ledger is parsed) and a rerun
+    after a widget change (served from the caches), which is what a user waits for on every interaction.
+    """
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    os.environ['BENCH_LEDGER_PATH'] = file_path
+    harness = os.path.join(REPO_DIR, 'benchmarks', 'app_harness.py')
+    cold_runs, reruns = [], []
+    for _ in range(repeat):
+        app = AppTest.from_file(harness, default_timeout=600)
+        app.run()
+        for widget in app.number_input:
+            if widget.label in CONTRACT_INPUTS:
+                widget.set_value(CONTRACT_INPUTS[widget.label])
+
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        started = time.perf_counter()
+        app.run()
+        cold_runs.append(time.perf_counter() - started)
+        if app.exception:
+            raise RuntimeError(f'app raised: {app.exception[0].value}')
+
+        amount = next(w for w in app.number_input if w.label == "거래금액($)")
+        amount.set_value(amount.value + 1_000.0)
+        started = time.perf_counter()
+        app.run()
+        reruns.append(time.perf_counter() - started)
+
+    return [
+        {'stage': stage, 'rows': rows, 'seconds_best': min(timings), 'seconds_median': statistics.median(timings)}
+        for stage, timings in (('app_cold_run', cold_runs), ('app_rerun', reruns))
+    ]
+
+
+def result_key(result):
+    return result['stage'], result.get('rows'), result.get('contracts')
+
+
+def result_value(result):
+    # Timed stages are compared by their best time, the memory stage by its size
+    return result['bytes'] if 'bytes' in result else result['seconds_best']
+
+
+def format_value(result, value):
+    return f'{value / 1024 / 1024:9.2f}MB' if 'bytes' in result else f'{value:10.4f}s'
+
+
+def compare(results, baseline, threshold):
+    """Prints the best-time (or size) ratio of every stage against the baseline and returns the regressions."""
+    baseline_best = {result_key(result): result_value(result) for result in baseline['results']}
+    regressions = []
+    for result in results:
+        previous = baseline_best.get(result_key(result))
+        if not previous:
+            continue
+        ratio = result_value(result) / previous
+        flag = ' REGRESSION' if ratio > threshold else ''
+        print(f'{format_key(result):45s} {format_value(result, previous)} -> '
+              f'{format_value(result, result_value(result))}  x{ratio:5.2f}{flag}')
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def format_key(result):
+    stage, rows, contracts = result_key(result)
+    size = f'{rows} rows' if rows is not None else f'{contracts} contracts'
+    return f'{stage} ({size})'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS), help='ledger sizes to generate')
+    parser.add_argument('--contracts', type=int, nargs='+', default=list(DEFAULT_CONTRACTS), help='contract book sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(REPO_DIR, 'benchmarks', 'data'),
+                        help='where generated workbooks are kept between runs')
+    parser.add_argument('--e2e-max-rows', type=int, default=DEFAULT_E2E_MAX_ROWS,
+                        help='largest ledger driven through the headless app rerun (0 disables it)')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    parser.add_argument('--compare', help='baseline JSON written by an earlier --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in args.rows:
+        file_path = workbook_path(args.data_dir, rows, args.seed)
+        results.extend(bench_ledger(rows, file_path, args.repeat))
+        if rows <= args.e2e_max_rows:
+            results.extend(bench_app_rerun(rows, file_path, args.repeat))
+    for contracts in args.contracts:
+        results.extend(bench_portfolio(contracts, args.repeat, args.seed))
+
+    for result in results:
+        if 'bytes' in result:
+            print(f'{format_key(result):45s} size {format_value(result, result["bytes"])}  '
+                  f'{result["bytes"] / max(result["rows"], 1):8.1f} bytes/row')
+        else:
+            print(f'{format_key(result):45s} best {result["seconds_best"]:10.4f}s  median {result["seconds_median"]:10.4f}s')
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f'\ncompared with {baseline["environment"].get("git_revision")}:')
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
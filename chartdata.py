@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from periods import month_key_to_label, ordinal_to_month_key
+from portfolio import MATURITY_COLUMN
+
+# Altair embeds chart data inline in the spec and refuses frames above this many rows
+MAX_CHART_ROWS = 5000
+
+# Display grains (months are summed into one bar per month, quarter or year) and their chart-title prefixes
+GRAINS = {'월': '월별', '분기': '분기별', '연': '연도별'}
+
+# Horizons longer than this many months are drawn per quarter by default
+MONTHLY_GRAIN_LIMIT = 36
+
+# Groups drawn separately in a breakdown; the rest are summed into OTHER_GROUP
+MAX_GROUPS = 8
+OTHER_GROUP = '기타'
+
+# Optional contract-book columns offered as breakdowns besides the transaction type and expiry month
+COUNTERPARTY_COLUMNS = ('거래상대방', '거래처', '은행')
+
+# P&L measures of a ScenarioTable that can be broken down
+MEASURES = ('파생상품 손익', '평가손익', '거래손익')
+
+# Contracts listed by a drill-down (largest |파생상품 손익| first)
+DRILL_DOWN_ROWS = 200
+
+
+def default_grain(periods):
+    """Returns '월' for horizons up to MONTHLY_GRAIN_LIMIT months and '분기' beyond."""
+    return '월' if len(periods) <= MONTHLY_GRAIN_LIMIT else '분기'
+
+
+def period_buckets(periods, grain):
+    """
+    Maps every month of the PeriodIndex `periods` to its display period at `grain`.
+    Returns (codes, labels): the period position of every month and the period labels in order
+    ('2025년 3월', '2025년 1분기' or '2025년').
+    """
+    if grain == '월':
+        return np.arange(len(periods)), list(periods.labels)
+    years = periods.ordinals // 12
+    if grain == '분기':
+        keys, codes = np.unique(years * 4 + periods.ordinals % 12 // 3, return_inverse=True)
+        return codes, [f"{key // 4}년 {key % 4 + 1}분기" for key in keys.tolist()]
+    keys, codes = np.unique(years, return_inverse=True)
+    return codes, [f"{key}년" for key in keys.tolist()]
+
+
+def aggregate_months(periods, columns, grain):
+    """
+    Returns a frame with one row per display period at `grain`: '결산연월' and every entry of
+    `columns` ({name: values over the months of `periods`}) summed over the period.
+    """
+    codes, labels = period_buckets(periods, grain)
+    data = {'결산연월': labels}
+    for name, values in columns.items():
+        data[name] = np.bincount(codes, weights=np.asarray(values, dtype=np.float64), minlength=len(labels))
+    return pd.DataFrame(data)
+
+
+def breakdown_dimensions(df_book):
+    """Returns the contract attributes a book's P&L can be broken down by."""
+    return ['선도환거래종류', '만기연월'] + [col for col in COUNTERPARTY_COLUMNS if col in df_book.columns]
+
+
+def contract_groups(df_book, dimension):
+    """
+    Returns (codes, groups): the group position of every contract under `dimension` and the group names.
+
+    The MAX_GROUPS groups with the largest 거래금액($) are kept (expiry months in calendar order,
+    other groups by amount); the remaining contracts share OTHER_GROUP as the last group.
+    """
+    if dimension == '만기연월':
+        values = df_book['expiry_ordinal']
+    else:
+        values = df_book[dimension].astype(str).str.strip()
+    amounts = df_book['거래금액($)'].abs().groupby(values.to_numpy()).sum().sort_values(ascending=False, kind='stable')
+    kept = amounts.index[:MAX_GROUPS]
+    if dimension == '만기연월':
+        kept = kept.sort_values()
+    codes = pd.Categorical(values, categories=kept).codes.astype(np.int64)
+
+    groups = [month_key_to_label(ordinal_to_month_key(int(v))) for v in kept] if dimension == '만기연월' else list(kept)
+    if (codes < 0).any():
+        codes[codes < 0] = len(groups)
+        groups.append(OTHER_GROUP)
+    return codes, groups
+
+
+def _measure_matrix(table, measure):
+    # Month x contract matrix of one measure of a ScenarioTable
+    if measure == '평가손익':
+        return table.valuation
+    if measure == '거래손익':
+        return table.settlement
+    return table.valuation + table.settlement
+
+
+def breakdown_frame(table, dimension, measure, grain):
+    """
+    Returns the `measure` of a portfolio.ScenarioTable by display period and group of `dimension` in
+    long form (in 백만원): '결산연월', '구분' and '손익 (백만원)'.
+
+    Contracts are summed into their groups with one matrix product, so the frame has at most
+    periods x (MAX_GROUPS + 1) rows however many contracts the book holds.
+    """
+    codes, groups = contract_groups(table.df_book, dimension)
+    membership = np.zeros((len(codes), len(groups)))
+    membership[np.arange(len(codes)), codes] = 1.0
+    monthly = _measure_matrix(table, measure) @ membership
+
+    period_codes, labels = period_buckets(table.periods, grain)
+    per_period = np.zeros((len(labels), len(groups)))
+    np.add.at(per_period, period_codes, monthly)
+    return pd.DataFrame({
+        '결산연월': np.repeat(labels, len(groups)),
+        '구분': np.tile(np.array(groups, dtype=object), len(labels)),
+        '손익 (백만원)': per_period.ravel() / 1_000_000,
+    })
+
+
+def drill_down(table, period, grain, dimension=None, group=None, limit=DRILL_DOWN_ROWS):
+    """
+    Returns the contracts behind one display period of a portfolio.ScenarioTable and how many there are.
+
+    Only the rows of the months in position `period` (at `grain`) are read from the month-major
+    matrices, and each contract in its term during the period gets its 평가손익, 거래손익 and
+    파생상품 손익 summed over them; `group` of `dimension` narrows the contracts further.
+    At most `limit` contracts are returned, largest |파생상품 손익| first.
+    """
+    period_codes, _ = period_buckets(table.periods, grain)
+    months = np.flatnonzero(period_codes == period)
+    df_book = table.df_book
+
+    valuation = table.valuation[months].sum(axis=0)
+    settlement = table.settlement[months].sum(axis=0)
+    total = valuation + settlement
+    first, last = table.periods.ordinals[months[0]], table.periods.ordinals[months[-1]]
+    selected = (df_book['start_ordinal'].to_numpy() <= last) & (df_book['expiry_ordinal'].to_numpy() >= first)
+    if group is not None:
+        codes, groups = contract_groups(df_book, dimension)
+        selected &= codes == groups.index(group)
+
+    positions = np.flatnonzero(selected)
+    shown = positions[np.argsort(-np.abs(total[positions]), kind='stable')[:limit]]
+    df_contracts = pd.DataFrame({
+        '계약번호': shown + 1,
+        '선도환거래종류': df_book['선도환거래종류'].to_numpy()[shown],
+        '거래금액($)': df_book['거래금액($)'].to_numpy()[shown],
+        '계약환율': df_book['계약환율'].to_numpy()[shown],
+        MATURITY_COLUMN: df_book[MATURITY_COLUMN].dt.date.to_numpy()[shown],
+    })
+    for col in COUNTERPARTY_COLUMNS:
+        if col in df_book.columns:
+            df_contracts[col] = df_book[col].to_numpy()[shown]
+    df_contracts['평가손익'] = valuation[shown]
+    df_contracts['거래손익'] = settlement[shown]
+    df_contracts['파생상품 손익'] = total[shown]
+    return df_contracts, len(positions)
@@ -0,0 +1,221 @@
+import math
+
+import altair as alt
+import pandas as pd
+
+from instrumentation import stage
+
+
+def build_scenario_chart(df_scenario, ordered_month_strings, title):
+    """
+    Builds a grouped bar chart from a frame with '결산연월' and one column per P&L type (in 백만원).
+    Months are ordered by `ordered_month_strings`.
+    """
+    value_columns = [col for col in df_scenario.columns if col != '결산연월']
+    with stage('pd.melt (scenario)', rows=len(df_scenario)):
+        df_melted = pd.melt(df_scenario, id_vars=['결산연월'],
+                                         value_vars=value_columns,
+                                         var_name='손익 종류', value_name='손익 (백만원)')
+
+    # Dynamically set Y-axis domain to ensure bars are always visible
+    min_pl = df_melted['손익 (백만원)'].min()
+    max_pl = df_melted['손익 (백만원)'].max()
+
+    buffer = 1.2
+    min_domain = -10.0
+    max_domain = 10.0
+
+    if not math.isclose(min_pl, 0.0) or not math.isclose(max_pl, 0.0):
+        abs_max = max(abs(min_pl), abs(max_pl))
+        min_domain = -abs_max * buffer
+        max_domain = abs_max * buffer
+
+    chart_domain = [min_domain, max_domain]
+
+    # Calculate dynamic chart width for horizontal scrolling if tenor is > 1 year
+    num_months = len(ordered_month_strings)
+    chart_width = max(600, num_months * 80) # Use a minimum width, then scale up
+
+    # --- 그룹 막대 차트로 변경하여 모든 월이 표시되도록 수정
+    with stage('alt.Chart (scenario)', rows=len(df_melted)):
+        chart = alt.Chart(df_melted).mark_bar(size=20).encode(
+            # Y축
+            y=alt.Y('손익 (백만원)', axis=alt.Axis(title='손익 (백만원)', format=',.2f'), scale=alt.Scale(domain=chart_domain)),
+            # 그룹을 위한 X축: 결산연월 (순서 강제 적용)
+            x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings),
+            # 그룹 내 막대 위치를 위한 X축 오프셋
+            xOffset=alt.XOffset('손익 종류:N'),
+            # 색상
+            color=alt.Color('손익 종류', legend=alt.Legend(title="손익 종류")),
+            # 툴팁
+            tooltip=[
+                alt.Tooltip('결산연월', title='결산연월'),
+                alt.Tooltip('손익 종류', title='손익 종류'),
+                alt.Tooltip('손익 (백만원)', title='손익 (백만원)', format=',.2f')
+            ]
+        ).properties(
+            title=title,
+            width=chart_width,
+            height=400
+        ).interactive()
+    return chart
+
+
+def build_fan_chart(df_bands, ordered_month_strings, title):
+    """
+    Builds nested percentile bands (1-99, 5-95, 25-75) and the median line from the long-form
+    output of SimulationResult.percentile_bands() (in 원), labelled with '결산연월'.
+    """
+    df_wide = df_bands.pivot(index='결산연월', columns='percentile', values='pl') / 1_000_000
+    df_wide.columns = [f"p{col}" for col in df_wide.columns]
+    df_wide = df_wide.reset_index()
+
+    base = alt.Chart(df_wide).encode(
+        x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings)
+    )
+    bands = [
+        base.mark_area(opacity=opacity, color='#1f77b4').encode(
+            y=alt.Y(f'p{low}:Q', axis=alt.Axis(title='손익 (백만원)', format=',.2f')),
+            y2=f'p{high}:Q',
+        )
+        for low, high, opacity in [(1, 99, 0.15), (5, 95, 0.25), (25, 75, 0.4)]
+    ]
+    median = base.mark_line(point=True, color='#d62728').encode(
+        y='p50:Q',
+        tooltip=[
+            alt.Tooltip('결산연월', title='결산연월'),
+            alt.Tooltip('p5:Q', title='5% (백만원)', format=',.2f'),
+            alt.Tooltip('p50:Q', title='중앙값 (백만원)', format=',.2f'),
+            alt.Tooltip('p95:Q', title='95% (백만원)', format=',.2f'),
+        ]
+    )
+    return alt.layer(*bands, median).properties(
+        title=title,
+        width=max(600, len(ordered_month_strings) * 80),
+        height=400
+    )
+
+
+def build_rate_chart(df_rates_for_chart, ordered_month_strings):
+    """
+    Builds the line chart of 계약환율 and the ledger's month-end 외화평가 환율 from a frame
+    with one row per '결산연월'. Months without a rate are left out of the lines, and
+    '계약환율' is optional (it is only drawn for the contract's currency).
+    """
+    rate_columns = [col for col in ('계약환율', '외화평가 환율') if col in df_rates_for_chart.columns]
+    # Melt the DataFrame to prepare for plotting multiple lines
+    with stage('pd.melt (rates)', rows=len(df_rates_for_chart)):
+        df_rates_for_chart_melted = pd.melt(df_rates_for_chart,
+                                             id_vars=['결산연월'],
+                                             value_vars=rate_columns,
+                                             var_name='환율 종류',
+                                             value_name='환율')
+
+    # Drop rows where '환율' is NaN, which happens if there's no data for a month
+    df_rates_for_chart_melted.dropna(subset=['환율'], inplace=True)
+
+    # Calculate a dynamic domain for the line chart's Y-axis to improve visibility
+    min_rate = df_rates_for_chart_melted['환율'].min()
+    max_rate = df_rates_for_chart_melted['환율'].max()
+
+    if math.isclose(min_rate, max_rate):
+        buffer = min_rate * 0.05
+    else:
+        buffer = (max_rate - min_rate) * 0.1
+
+    rate_domain = [min_rate - buffer, max_rate + buffer]
+
+    # Generate Altair line chart
+    with stage('alt.Chart (rates)', rows=len(df_rates_for_chart_melted)):
+        line_chart = alt.Chart(df_rates_for_chart_melted).mark_line(point=True).encode(
+            x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings),
+            y=alt.Y('환율', axis=alt.Axis(title='환율', format=',.2f'), scale=alt.Scale(domain=rate_domain)),
+            color=alt.Color('환율 종류', legend=alt.Legend(title="환율 종류")),
+            tooltip=[
+                alt.Tooltip('결산연월', title='결산연월'),
+                alt.Tooltip('환율 종류', title='환율 종류'),
+                alt.Tooltip('환율', title='환율', format=',.2f')
+            ]
+        ).properties(
+            title='계약환율 대비 외화평가 시점별 환율 변동',
+            width=800,
+            height=400
+        ).interactive()
+    return line_chart
+
+
+def build_heatmap(df_grid, ordered_month_strings, measure):
+    """
+    Builds the rate-shock x settlement-month heatmap from the long-form sensitivity grid,
+    colored by '손익 (백만원)' of `measure`.
+    """
+    return alt.Chart(df_grid).mark_rect().encode(
+        x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings),
+        y=alt.Y('shock:O', axis=alt.Axis(title='선도환율 충격 (원)'), sort='descending'),
+        color=alt.Color('손익 (백만원):Q', scale=alt.Scale(scheme='redblue', domainMid=0), legend=alt.Legend(title=f"{measure} (백만원)")),
+        tooltip=[
+            alt.Tooltip('결산연월', title='결산연월'),
+            alt.Tooltip('shock:Q', title='충격 (원)', format='+,.1f'),
+            alt.Tooltip('손익 (백만원):Q', title=f"{measure} (백만원)", format=',.2f')
+        ]
+    ).properties(
+        title=f'환율 충격별 월별 {measure}',
+        width=max(600, len(ordered_month_strings) * 40),
+        height=400
+    )
+
+
+def build_effectiveness_chart(df_effectiveness, ordered_month_strings, title, offset_range):
+    """
+    Builds the line chart of the cumulative and rolling dollar-offset ratios (in %) from a frame with
+    '결산연월', '누적 상계비율 (%)' and '이동 상계비율 (%)', over the shaded effective range `offset_range`.
+    Months without a ratio are left out of the lines.
+    """
+    df_melted = pd.melt(df_effectiveness, id_vars=['결산연월'],
+                        value_vars=['누적 상계비율 (%)', '이동 상계비율 (%)'],
+                        var_name='구분', value_name='상계비율 (%)').dropna(subset=['상계비율 (%)'])
+
+    low, high = (bound * 100 for bound in offset_range)
+    band = alt.Chart(pd.DataFrame({'low': [low], 'high': [high]})).mark_rect(opacity=0.15, color='#2ca02c').encode(
+        y=alt.Y('low:Q'),
+        y2='high:Q',
+    )
+    lines = alt.Chart(df_melted).mark_line(point=True).encode(
+        x=alt.X('결산연월:O', axis=alt.Axis(title='결산 연월', labelAngle=0), sort=ordered_month_strings),
+        y=alt.Y('상계비율 (%):Q', axis=alt.Axis(title='상계비율 (%)', format=',.0f')),
+        color=alt.Color('구분', legend=alt.Legend(title="구분")),
+        tooltip=[
+            alt.Tooltip('결산연월', title='결산연월'),
+            alt.Tooltip('구분', title='구분'),
+            alt.Tooltip('상계비율 (%):Q', title='상계비율 (%)', format=',.1f')
+        ]
+    )
+    return alt.layer(band, lines).properties(
+        title=title,
+        width=max(600, len(ordered_month_strings) * 80),
+        height=300
+    )
+
+
+def build_breakdown_chart(df_breakdown, ordered_period_labels, title, dimension):
+    """
+    Builds a stacked bar chart from the long-form output of chartdata.breakdown_frame(), one bar per
+    display period split by the groups of `dimension` (in 백만원), stacked and colored in frame order.
+    """
+    group_order = list(dict.fromkeys(df_breakdown['구분']))
+    with stage('alt.Chart (breakdown)', rows=len(df_breakdown)):
+        chart = alt.Chart(df_breakdown).mark_bar().encode(
+            x=alt.X('결산연월:O', axis=alt.Axis(title='결산 기간', labelAngle=0), sort=ordered_period_labels),
+            y=alt.Y('손익 (백만원):Q', axis=alt.Axis(title='손익 (백만원)', format=',.2f')),
+            color=alt.Color('구분:N', sort=group_order, legend=alt.Legend(title=dimension)),
+            tooltip=[
+                alt.Tooltip('결산연월', title='결산 기간'),
+                alt.Tooltip('구분', title=dimension),
+                alt.Tooltip('손익 (백만원):Q', title='손익 (백만원)', format=',.2f')
+            ]
+        ).properties(
+            title=title,
+            width=max(600, len(ordered_period_labels) * 50),
+            height=400
+        )
+    return chart
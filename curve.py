@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+def interpolate_swap_points(days, tenor_days, points):
+    """
+    Linearly interpolates swap points (원) for each entry of `days`.
+    The curve is anchored at 0 points on the curve date and held flat beyond the longest tenor.
+    """
+    order = np.argsort(tenor_days)
+    knot_days = np.concatenate(([0.0], np.asarray(tenor_days, dtype=np.float64)[order]))
+    knot_points = np.concatenate(([0.0], np.asarray(points, dtype=np.float64)[order]))
+    return np.interp(np.clip(days, 0, None), knot_days, knot_points)
+
+
+@lru_cache(maxsize=64)
+def forward_curve(spot_rate, curve_date, swap_points, closing_dates):
+    """
+    Returns the expected forward rate (spot + interpolated swap points) for every date in `closing_dates`.
+
+    `swap_points` is a tuple of (tenor_days, points) pairs, e.g. ((31, -1.2), (92, -3.5), ...), where
+    tenor_days counts the actual days from `curve_date` to the tenor's maturity.
+    All arguments are hashable so each distinct input set is computed once and reused by every
+    contract and rerun. Closing dates on or before `curve_date` are valued at spot.
+    """
+    if not swap_points:
+        tenor_days, points = (30,), (0.0,)
+    else:
+        tenor_days, points = zip(*swap_points)
+    days = np.array([(closing_date - curve_date).days for closing_date in closing_dates], dtype=np.float64)
+    rates = spot_rate + interpolate_swap_points(days, tenor_days, points)
+
+    # The cached array is shared between callers
+    rates.flags.writeable = False
+    return rates
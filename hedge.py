@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Dollar-offset ratios (-Σ derivative P&L / Σ hedged FX P&L) considered highly effective (80%-125%)
+EFFECTIVE_OFFSET_RANGE = (0.8, 1.25)
+
+# Regression test: the slope of derivative P&L on FX P&L must lie in this range with at least this R²
+EFFECTIVE_SLOPE_RANGE = (-1.25, -0.8)
+EFFECTIVE_R_SQUARED = 0.8
+
+# Months per rolling window
+ROLLING_WINDOW = 3
+
+
+def dollar_offset(derivative, exposure, mask=None):
+    """
+    Returns -Σ derivative / Σ exposure over axis 0 for every column pair (NaN where the exposure
+    sums to 0). `mask` marks the months that are included; by default every month is.
+    """
+    derivative, exposure = np.broadcast_arrays(np.asarray(derivative, dtype=np.float64),
+                                               np.asarray(exposure, dtype=np.float64))
+    included = np.ones(derivative.shape, dtype=bool) if mask is None else np.broadcast_to(mask, derivative.shape)
+    exposure_sum = np.where(included, exposure, 0.0).sum(axis=0)
+    derivative_sum = np.where(included, derivative, 0.0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(exposure_sum != 0, -derivative_sum / exposure_sum, np.nan)
+
+
+def paired_regression(derivative, exposure, mask=None):
+    """
+    Fits `derivative = intercept + slope * exposure` by least squares for every column pair at once.
+
+    `derivative` and `exposure` are (months,) or (months, pairs) arrays broadcast against each other,
+    so one exposure series can be paired with thousands of contracts. `mask` marks the months of
+    each pair that are included (e.g. the months of a contract's term with ledger data).
+    Returns (slope, intercept, r_squared, observations); the fit is NaN for pairs with fewer than
+    two months or without exposure variance, and R² is NaN when the derivative P&L is constant.
+    """
+    derivative, exposure = np.broadcast_arrays(np.asarray(derivative, dtype=np.float64),
+                                               np.asarray(exposure, dtype=np.float64))
+    weights = (np.ones(derivative.shape) if mask is None else np.broadcast_to(mask, derivative.shape)).astype(np.float64)
+    # Excluded months may hold NaN; zero them so they drop out of the weighted sums
+    derivative = np.where(weights > 0, derivative, 0.0)
+    exposure = np.where(weights > 0, exposure, 0.0)
+
+    observations = weights.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_derivative = (weights * derivative).sum(axis=0) / observations
+        mean_exposure = (weights * exposure).sum(axis=0) / observations
+        derivative_dev = derivative - mean_derivative
+        exposure_dev = exposure - mean_exposure
+        sxx = (weights * exposure_dev * exposure_dev).sum(axis=0)
+        sxy = (weights * exposure_dev * derivative_dev).sum(axis=0)
+        syy = (weights * derivative_dev * derivative_dev).sum(axis=0)
+
+        fitted = (observations >= 2) & (sxx > 0)
+        slope = np.where(fitted, sxy / sxx, np.nan)
+        intercept = np.where(fitted, mean_derivative - slope * mean_exposure, np.nan)
+        r_squared = np.where(fitted & (syy > 0), sxy * sxy / (sxx * syy), np.nan)
+    return slope, intercept, r_squared, observations.astype(np.int64)
+
+
+def is_effective(offset, slope, r_squared):
+    """Returns True where both the dollar-offset and the regression test pass (NaN fails)."""
+    low, high = EFFECTIVE_OFFSET_RANGE
+    slope_low, slope_high = EFFECTIVE_SLOPE_RANGE
+    with np.errstate(invalid='ignore'):
+        return (
+            (offset >= low) & (offset <= high)
+            & (slope >= slope_low) & (slope <= slope_high)
+            & (r_squared >= EFFECTIVE_R_SQUARED)
+        )
+
+
+def rolling_effectiveness(derivative, exposure, mask, window):
+    """
+    Returns the dollar offset, slope and R² of every `window`-month window of two monthly series,
+    aligned to the window's last month (NaN for the first `window - 1` months).
+    The windows are fitted together as the columns of one paired regression.
+    """
+    months = len(derivative)
+    offset, slope, r_squared = (np.full(months, np.nan) for _ in range(3))
+    if months < window:
+        return offset, slope, r_squared
+
+    # (windows, window) views transposed to (window, windows): one column per window
+    windows = [sliding_window_view(np.asarray(values), window).T for values in (derivative, exposure, mask)]
+    offset[window - 1:] = dollar_offset(*windows)
+    slope[window - 1:], _, r_squared[window - 1:], _ = paired_regression(*windows)
+    return offset, slope, r_squared
+
+
+@dataclass
+class HedgeEffectiveness:
+    """
+    Effectiveness of derivative P&L against the ledger's 외화환산손익 over a series of months.
+
+    `table` is indexed by 'YYYY-MM' with both P&L series, the monthly and cumulative dollar offset
+    and the rolling dollar offset, slope and R²; the scalar fields cover every month with ledger data.
+    """
+    table: pd.DataFrame
+    dollar_offset: float
+    slope: float
+    intercept: float
+    r_squared: float
+    observations: int
+    window: int
+
+    @property
+    def effective(self):
+        return bool(is_effective(self.dollar_offset, self.slope, self.r_squared))
+
+
+def assess_hedge(month_keys, derivative_pl, monthly_fx_pl, window=ROLLING_WINDOW):
+    """
+    Measures how well `derivative_pl` (one amount per entry of `month_keys`) offsets the ledger's
+    외화환산손익 (`monthly_fx_pl`, keyed 'YYYY-MM'). Months without ledger data are left out.
+    """
+    derivative = np.asarray(derivative_pl, dtype=np.float64)
+    exposure = np.array([monthly_fx_pl.get(key, np.nan) for key in month_keys], dtype=np.float64)
+    has_exposure = ~np.isnan(exposure)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        monthly_offset = np.where(has_exposure & (exposure != 0), -derivative / exposure, np.nan)
+        cumulative_exposure = np.cumsum(np.where(has_exposure, exposure, 0.0))
+        cumulative_derivative = np.cumsum(np.where(has_exposure, derivative, 0.0))
+        cumulative_offset = np.where(cumulative_exposure != 0, -cumulative_derivative / cumulative_exposure, np.nan)
+    rolling_offset, rolling_slope, rolling_r_squared = rolling_effectiveness(derivative, exposure, has_exposure, window)
+    slope, intercept, r_squared, observations = paired_regression(derivative, exposure, has_exposure)
+
+    table = pd.DataFrame({
+        '파생상품 손익': derivative,
+        '외화환산손익': exposure,
+        '상계비율': monthly_offset,
+        '누적 상계비율': cumulative_offset,
+        '이동 상계비율': rolling_offset,
+        '이동 기울기': rolling_slope,
+        '이동 R²': rolling_r_squared,
+    }, index=pd.Index(list(month_keys), name='month_key'))
+    return HedgeEffectiveness(
+        table=table,
+        dollar_offset=float(dollar_offset(derivative, exposure, has_exposure)),
+        slope=float(slope),
+        intercept=float(intercept),
+        r_squared=float(r_squared),
+        observations=int(observations),
+        window=window,
+    )
+
+
+def contract_effectiveness(scenario_table, monthly_fx_pl):
+    """
+    Pairs every contract of a portfolio.ScenarioTable with the ledger's 외화환산손익 and returns one row
+    per contract: the months of its term with ledger data, dollar offset, slope, R² and whether both
+    tests pass. All pairs are fitted in one vectorized least-squares pass over the month x contract matrix.
+    """
+    periods = scenario_table.periods
+    df_book = scenario_table.df_book
+    derivative = scenario_table.valuation + scenario_table.settlement
+    exposure = np.array([monthly_fx_pl.get(key, np.nan) for key in periods.month_keys], dtype=np.float64)[:, None]
+
+    months = periods.ordinals[:, None]
+    in_term = (months >= df_book['start_ordinal'].to_numpy()[None, :]) & (months <= df_book['expiry_ordinal'].to_numpy()[None, :])
+    mask = in_term & ~np.isnan(exposure)
+
+    offset = dollar_offset(derivative, exposure, mask)
+    slope, _, r_squared, observations = paired_regression(derivative, exposure, mask)
+    return pd.DataFrame({
+        '계약번호': np.arange(1, len(df_book) + 1),
+        '선도환거래종류': df_book['선도환거래종류'].to_numpy(),
+        '거래금액($)': df_book['거래금액($)'].to_numpy(),
+        '관측 월수': observations,
+        '상계비율': offset,
+        '기울기': slope,
+        'R²': r_squared,
+        '유효': is_effective(offset, slope, r_squared),
+    })
@@ -0,0 +1,149 @@
+import contextvars
+import csv
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger('fx_dashboard.stages')
+
+# Rolling CSV of stage records (enabled by setting STAGE_LOG_PATH); rotated to '<path>.1' at this size
+STAGE_LOG_MAX_BYTES = 5 * 1024 * 1024
+
+_current_run = contextvars.ContextVar('stage_run', default=None)
+_csv_lock = threading.Lock()
+_tracing_lock = threading.Lock()
+_tracing_started_here = False
+_tracing_requests = 0
+
+
+@dataclass
+class StageRecord:
+    """Wall time, traced peak memory above the stage's starting point and row count of one stage."""
+    run_id: str
+    stage: str
+    timestamp: str = ''
+    seconds: float = 0.0
+    peak_bytes: int = None
+    rows: int = None
+
+
+@dataclass
+class StageRun:
+    """The stage records of one script run."""
+    run_id: str
+    trace_memory: bool = False
+    records: list = field(default_factory=list)
+    _frames: list = field(default_factory=list, repr=False)
+
+    def table(self):
+        """Returns the records as a DataFrame, one row per stage in completion order."""
+        return pd.DataFrame([asdict(record) for record in self.records],
+                            columns=[f.name for f in fields(StageRecord)])
+
+
+def _request_tracing():
+    # tracemalloc is process-wide: it runs while at least one traced run is alive
+    global _tracing_requests, _tracing_started_here
+    with _tracing_lock:
+        _tracing_requests += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started_here = True
+
+
+def _release_tracing():
+    # Only tracing that was started here is stopped, once the last traced run is gone
+    global _tracing_requests, _tracing_started_here
+    with _tracing_lock:
+        _tracing_requests -= 1
+        if _tracing_requests == 0 and _tracing_started_here and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            _tracing_started_here = False
+
+
+def start_run(trace_memory=False):
+    """
+    Starts recording the stages of the current script run and returns its StageRun.
+
+    Stages entered outside a run (e.g. in worker processes or the benchmark suite) are not recorded.
+    Memory tracing slows allocation-heavy code down and is shared by every session of the process,
+    so it is reference-counted: a run with `trace_memory` keeps it on until the run is garbage
+    collected (the dashboard holds its run until the next rerun), and runs of other sessions
+    never stop it in the middle of a traced stage.
+    """
+    run = StageRun(run_id=uuid.uuid4().hex[:12], trace_memory=trace_memory)
+    if trace_memory:
+        _request_tracing()
+        weakref.finalize(run, _release_tracing)
+    _current_run.set(run)
+    return run
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Records the wall time, peak traced memory and row count of the enclosed block.
+    The yielded StageRecord's `rows` can be set inside the block once the row count is known.
+    """
+    run = _current_run.get()
+    record = StageRecord(run_id=run.run_id if run else '', stage=name, rows=rows)
+    if run is None:
+        yield record
+        return
+
+    tracing = run.trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        # Resetting the peak hides it from the enclosing stage, so carry it over explicitly
+        baseline, enclosing_peak = tracemalloc.get_traced_memory()
+        if run._frames:
+            run._frames[-1][1] = max(run._frames[-1][1], enclosing_peak)
+        tracemalloc.reset_peak()
+        frame = [baseline, baseline]
+        run._frames.append(frame)
+
+    record.timestamp = datetime.now().isoformat(timespec='milliseconds')
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - started
+        if tracing:
+            run._frames.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], frame[1]) if tracemalloc.is_tracing() else frame[1]
+            record.peak_bytes = peak - frame[0]
+            if run._frames:
+                run._frames[-1][1] = max(run._frames[-1][1], peak)
+        run.records.append(record)
+        _emit(record)
+
+
+def _emit(record):
+    values = asdict(record)
+    logger.info(json.dumps(values, ensure_ascii=False))
+
+    log_path = os.environ.get('STAGE_LOG_PATH')
+    if not log_path:
+        return
+    with _csv_lock:
+        try:
+            if os.path.exists(log_path) and os.path.getsize(log_path) >= STAGE_LOG_MAX_BYTES:
+                os.replace(log_path, log_path + '.1')
+            is_new = not os.path.exists(log_path)
+            with open(log_path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=list(values))
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(values)
+        except OSError:
+            # Instrumentation must never break the dashboard
+            logger.exception("could not write stage log %s", log_path)
@@ -0,0 +1,868 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from periods import month_ordinal, ordinal_to_month_key
+from schedule import closing_calendar
+
+# Columns that must be present in the uploaded 계정별원장; every other column is dropped on read
+REQUIRED_COLUMNS = ['회계일', '계정명', '차변', '대변', '환율', '거래환종']
+
+# A normalized ledger holds only the required columns, typed as:
+#   회계일 datetime64, 계정명/거래환종 category, 차변/대변 whole won as int32/int64
+#   (float64 if some amount has a fraction), 환율 float64,
+# plus the derived 'account_class' (category), 'fx_pl' (the amounts' dtype) and
+# 'month' (int32 month ordinal, see periods.month_ordinal; NO_MONTH for rows without a date)
+NO_MONTH = -1
+
+# Background ingestion processes per LedgerCache (see LedgerCache.submit)
+INGEST_WORKERS = 2
+
+# Below this many bytes of uncached workbooks, LedgerCache.summaries() parses them one by one:
+# spawning worker processes costs more than parsing small files in parallel saves
+PARALLEL_PARSE_BYTES = 2 * 1024 * 1024
+
+# Worker processes are spawned, not forked: the Streamlit server is multithreaded and a fork taken
+# while another thread holds a lock (cache, store, logging) would leave that lock held in the child
+WORKER_CONTEXT = multiprocessing.get_context('spawn')
+
+# Bumped whenever the normalized columns or dtypes change, so stale Parquet copies are not reused
+LEDGER_SCHEMA_VERSION = 2
+
+# Number of leading rows inspected when looking for the header row
+HEADER_SEARCH_ROWS = 50
+
+# Account classification rules, checked in order against each distinct 계정명
+# (case-insensitive regular expressions; the first matching rule wins)
+ACCOUNT_RULES = (
+    ('subtotal', '월계|누계'),
+    ('fx_gain', '외화환산이익'),
+    ('fx_loss', '외화환산손실'),
+    ('fx_realized_gain', '외환차익'),
+    ('fx_realized_loss', '외환차손'),
+    ('derivative_gain', '파생상품.*이익'),
+    ('derivative_loss', '파생상품.*손실'),
+)
+
+# Label of accounts that match no rule
+ACCOUNT_OTHER = 'other'
+
+# Rows per typed chunk produced by the streaming reader
+STREAM_CHUNK_ROWS = 50_000
+
+# Workbooks at least this large are aggregated with the streaming reader
+# instead of being loaded into a single DataFrame
+STREAM_THRESHOLD_BYTES = 20 * 1024 * 1024
+
+
+class LedgerHeaderError(ValueError):
+    """Raised when none of the inspected rows contains all required columns."""
+
+
+def file_digest(file_bytes):
+    """
+    Returns the SHA-256 hex digest of the uploaded file contents.
+    The digest is used as the cache key, so the same workbook is parsed only once.
+    """
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def find_header_row(df_temp):
+    """
+    Returns the index of the first row that contains all required columns
+    (case-insensitive and with stripping), or None if there is no such row.
+    """
+    required_lower = [col.lower() for col in REQUIRED_COLUMNS]
+    for i in range(len(df_temp)):
+        row_values = {str(x).strip().lower() for x in df_temp.iloc[i]}
+        if all(col in row_values for col in required_lower):
+            return i
+    return None
+
+
+def classify_accounts(account_names, rules=ACCOUNT_RULES):
+    """
+    Labels every row of `account_names` with the first matching rule of `rules`.
+
+    The names are converted to a categorical and only the distinct account names are
+    matched, so the cost grows with the number of accounts rather than the number of rows.
+    Returns a categorical whose categories are the rule labels plus ACCOUNT_OTHER.
+    """
+    names = account_names.astype('category')
+    distinct_names = names.cat.categories.astype(str)
+
+    label_names = [label for label, _ in rules] + [ACCOUNT_OTHER]
+    other_code = len(rules)
+    category_labels = np.full(len(distinct_names), other_code, dtype=np.int8)
+    with stage('str.contains', rows=len(distinct_names)):
+        for code, (_, pattern) in reversed(list(enumerate(rules))):
+            matches = distinct_names.str.contains(pattern, case=False, regex=True, na=False)
+            category_labels[np.asarray(matches, dtype=bool)] = code
+
+    # Rows without an account name (code -1) fall into ACCOUNT_OTHER
+    row_codes = names.cat.codes.to_numpy()
+    label_codes = np.where(row_codes >= 0, category_labels[row_codes], other_code)
+    return pd.Categorical.from_codes(label_codes, categories=label_names)
+
+
+def won_amounts(values):
+    """
+    Narrows a numeric amount column: whole-won amounts are stored as int32 (int64 if they
+    do not fit), exact at half the size of float64; any fractional amount keeps it float64.
+    """
+    amounts = values.to_numpy(dtype=np.float64)
+    largest = np.abs(amounts).max(initial=0)
+    if not np.isfinite(largest) or largest >= 2 ** 53 or not np.array_equal(amounts, np.trunc(amounts)):
+        return amounts
+    # The bound is symmetric so that negating a debit (fx_pl) cannot overflow
+    return amounts.astype(np.int32 if largest <= np.iinfo(np.int32).max else np.int64)
+
+
+def currency_codes(values):
+    """
+    Stores 거래환종 as a categorical of stripped, upper-cased codes ('usd ' and 'USD' share a category).
+    Only the distinct values are normalized, not every row.
+    """
+    raw = values.astype('category')
+    names = raw.cat.categories.astype(str).str.strip().str.upper()
+    categories = pd.Index(names.unique())
+    codes = raw.cat.codes.to_numpy()
+    row_codes = np.where(codes >= 0, categories.get_indexer(names)[codes], -1)
+    return pd.Categorical.from_codes(row_codes, categories=categories)
+
+
+def coerce_ledger(df_ledger):
+    """
+    Strips the column names, keeps only the required columns and converts them to the
+    normalized types: numeric amounts/rates, categorical 거래환종 and datetime '회계일'.
+    """
+    df_ledger.columns = [str(col).strip() for col in df_ledger.columns]
+    df_ledger = df_ledger[REQUIRED_COLUMNS]
+
+    # Convert columns to numeric, coercing errors to 0
+    df_ledger['차변'] = pd.to_numeric(df_ledger['차변'], errors='coerce').fillna(0)
+    df_ledger['대변'] = pd.to_numeric(df_ledger['대변'], errors='coerce').fillna(0)
+    df_ledger['환율'] = pd.to_numeric(df_ledger['환율'], errors='coerce').fillna(0).astype(np.float64)
+    df_ledger['거래환종'] = currency_codes(df_ledger['거래환종'])
+
+    # Convert '회계일' to datetime
+    with stage('pd.to_datetime', rows=len(df_ledger)):
+        df_ledger['회계일'] = pd.to_datetime(df_ledger['회계일'])
+    return df_ledger
+
+
+def label_accounts(df_ledger, rules=ACCOUNT_RULES):
+    """Adds the categorical 'account_class' label, drops 월계/누계 subtotal rows and narrows the amounts."""
+    # Classify the distinct account names once and map the labels back through category codes
+    df_ledger['계정명'] = df_ledger['계정명'].astype('category')
+    df_ledger['account_class'] = classify_accounts(df_ledger['계정명'], rules)
+
+    # Filter out 월계/누계 subtotal rows
+    df_ledger = df_ledger[df_ledger['account_class'] != 'subtotal'].reset_index(drop=True)
+
+    # Amounts are narrowed only now: the running 누계 totals would not fit int32
+    df_ledger['차변'] = won_amounts(df_ledger['차변'])
+    df_ledger['대변'] = won_amounts(df_ledger['대변'])
+    return df_ledger
+
+
+def derive_fx_pl(df_ledger):
+    """Adds the 'fx_pl' amount of each row and its int32 'month' ordinal."""
+    # FX P&L: 외화환산이익 is booked on the credit side, 외화환산손실 on the debit side
+    account_class = df_ledger['account_class']
+    debit, credit = df_ledger['차변'].to_numpy(), df_ledger['대변'].to_numpy()
+    df_ledger['fx_pl'] = np.where(
+        account_class == 'fx_gain', credit,
+        np.where(account_class == 'fx_loss', -debit, np.zeros(1, dtype=debit.dtype))
+    ).astype(np.result_type(debit, credit))
+
+    # Month ordinals instead of 'YYYY-MM' strings; keys are only formatted per distinct month
+    posted_on = df_ledger['회계일']
+    df_ledger['month'] = month_ordinal(posted_on.dt.year, posted_on.dt.month).fillna(NO_MONTH).astype(np.int32)
+    return df_ledger
+
+
+def month_keys(months):
+    """Returns the 'YYYY-MM' key of every entry of a 'month' column (NaN for NO_MONTH)."""
+    keys = {month: ordinal_to_month_key(int(month)) for month in months.unique() if month != NO_MONTH}
+    return months.map(keys)
+
+
+def _by_month_key(monthly):
+    # Yields ('YYYY-MM', value) for a Series indexed by month ordinal, skipping rows without a date
+    for month, value in monthly.items():
+        if month != NO_MONTH:
+            yield ordinal_to_month_key(int(month)), value
+
+
+def memory_footprint(df_ledger):
+    """
+    Returns the resident memory of a ledger per column: its dtype, bytes (including string and
+    category payloads) and bytes per row, followed by a 'total' row.
+    """
+    column_bytes = df_ledger.memory_usage(index=True, deep=True)
+    report = pd.DataFrame({
+        'column': [str(name) for name in column_bytes.index],
+        'dtype': ['' if name == 'Index' else str(df_ledger[name].dtype) for name in column_bytes.index],
+        'bytes': column_bytes.to_numpy(),
+    })
+    report.loc[len(report)] = ['total', '', int(column_bytes.sum())]
+    report['bytes_per_row'] = report['bytes'] / max(len(df_ledger), 1)
+    return report
+
+
+def normalize_ledger(df_ledger, rules=ACCOUNT_RULES):
+    """
+    Coerces the raw ledger into the typed shape used by the dashboard:
+    the required columns only, won amounts, float rates, datetime '회계일',
+    categorical '계정명' with its 'account_class' label and categorical '거래환종',
+    no 월계/누계 subtotal rows, and the derived 'fx_pl' and 'month' columns.
+    """
+    df_ledger = coerce_ledger(df_ledger)
+    df_ledger = label_accounts(df_ledger, rules)
+    return derive_fx_pl(df_ledger)
+
+
+def detect_header_row(file_bytes):
+    """
+    Returns the header row index of an uploaded workbook from its first HEADER_SEARCH_ROWS rows.
+    Raises LedgerHeaderError if the header row cannot be found.
+    """
+    with stage('read_excel (header search)') as record:
+        df_temp = pd.read_excel(io.BytesIO(file_bytes), header=None, nrows=HEADER_SEARCH_ROWS)
+        record.rows = len(df_temp)
+    with stage('header search loop', rows=len(df_temp)):
+        header_row = find_header_row(df_temp)
+    if header_row is None:
+        raise LedgerHeaderError("required ledger columns not found")
+    return header_row
+
+
+def read_ledger_frame(file_bytes, header_row):
+    """Reads the required columns of the workbook using the identified header row."""
+    required_lower = {col.lower() for col in REQUIRED_COLUMNS}
+    with stage('read_excel (ledger)') as record:
+        df_ledger = pd.read_excel(io.BytesIO(file_bytes), header=header_row,
+                                  usecols=lambda col: str(col).strip().lower() in required_lower)
+        record.rows = len(df_ledger)
+    return df_ledger
+
+
+def parse_ledger(file_bytes):
+    """
+    Parses an uploaded workbook into a normalized ledger DataFrame.
+    Raises LedgerHeaderError if the header row cannot be found.
+    """
+    header_row = detect_header_row(file_bytes)
+    return normalize_ledger(read_ledger_frame(file_bytes, header_row))
+
+
+@dataclass
+class LedgerSummary:
+    """
+    Monthly aggregates the dashboard needs from a ledger.
+
+    `monthly_fx_pl` maps 'YYYY-MM' to the summed 외화환산손익,
+    `month_end_rates` maps each 거래환종 to {'YYYY-MM': closing 환율} and
+    `monthly_row_counts` maps 'YYYY-MM' to the number of ledger rows posted in the month.
+
+    The closing rate of a month is taken from the currency's last posting date in the month,
+    provided it falls on or after the month's last business day (so a month closed on Friday
+    the 29th still has a rate); the highest 환율 posted on that date is used.
+    `closing_dates` keeps that date per (currency, month) while chunks are folded in.
+    """
+    monthly_fx_pl: dict = field(default_factory=dict)
+    month_end_rates: dict = field(default_factory=dict)
+    monthly_row_counts: dict = field(default_factory=dict)
+    row_count: int = 0
+    closing_dates: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def usd_month_end_rates(self):
+        return self.month_end_rates.get('USD', {})
+
+    @property
+    def currencies(self):
+        return sorted(self.month_end_rates)
+
+    def rate_panel(self):
+        """Returns the month x currency table of closing rates (NaN where a currency has no closing posting)."""
+        panel = pd.DataFrame(self.month_end_rates, columns=self.currencies, dtype=np.float64).sort_index()
+        panel.index.name = 'month_key'
+        return panel
+
+    def add_chunk(self, df_chunk):
+        """Folds one normalized ledger chunk into the running aggregates."""
+        self.row_count += len(df_chunk)
+        with stage('groupby', rows=len(df_chunk)):
+            monthly_fx_pl = df_chunk.groupby('month')['fx_pl'].sum()
+            monthly_row_counts = df_chunk['month'].value_counts()
+
+        for month_key, fx_pl in _by_month_key(monthly_fx_pl):
+            self.monthly_fx_pl[month_key] = self.monthly_fx_pl.get(month_key, 0.0) + float(fx_pl)
+        for month_key, count in _by_month_key(monthly_row_counts):
+            self.monthly_row_counts[month_key] = self.monthly_row_counts.get(month_key, 0) + int(count)
+
+        with stage('rate panel', rows=len(df_chunk)):
+            closing = closing_rates(df_chunk)
+        for (month_key, currency), posted_on, rate in zip(closing.index, closing['posted_on'], closing['rate']):
+            previous = self.closing_dates.get((currency, month_key))
+            rates = self.month_end_rates.setdefault(currency, {})
+            if previous is None or posted_on > previous:
+                self.closing_dates[(currency, month_key)] = posted_on
+                rates[month_key] = rate
+            elif posted_on == previous:
+                rates[month_key] = max(rate, rates[month_key])
+
+
+def closing_rates(df_ledger):
+    """
+    Returns the closing posting date and rate of every (month_key, currency) in one grouped pass.
+
+    Only postings with a rate, dated on or after their month's last business day, are candidates;
+    of those, the rows on the latest date are kept and their highest 환율 is the closing rate.
+    """
+    posted_on = df_ledger['회계일'].to_numpy().astype('datetime64[D]')
+    currencies = df_ledger['거래환종'].cat
+    currency_codes = currencies.codes.to_numpy()
+    is_candidate = (
+        (posted_on >= closing_calendar().last_business_days(posted_on))
+        & (df_ledger['환율'].to_numpy() > 0)
+        & (currency_codes >= 0)
+    )
+    # Grouped on the integer month ordinals and category codes; keys are formatted per group only
+    df_candidates = pd.DataFrame({
+        'month': df_ledger['month'].to_numpy()[is_candidate],
+        'currency': currency_codes[is_candidate],
+        'posted_on': posted_on[is_candidate],
+        'rate': df_ledger['환율'].to_numpy()[is_candidate],
+    })
+    keys = ['month', 'currency']
+    df_candidates = df_candidates[
+        df_candidates['posted_on'] == df_candidates.groupby(keys)['posted_on'].transform('max')
+    ]
+    closing = df_candidates.groupby(keys).agg(posted_on=('posted_on', 'max'), rate=('rate', 'max'))
+    closing.index = pd.MultiIndex.from_arrays([
+        [ordinal_to_month_key(int(month)) for month in closing.index.get_level_values('month')],
+        currencies.categories[closing.index.get_level_values('currency')],
+    ], names=['month_key', 'currency'])
+    return closing
+
+
+def summarize_ledger(df_ledger):
+    """Returns the LedgerSummary of an already normalized ledger."""
+    summary = LedgerSummary()
+    summary.add_chunk(df_ledger)
+    return summary
+
+
+def merge_summaries(summaries):
+    """
+    Merges the summaries of several uploaded ledgers into one.
+
+    ERP exports by month and by year overlap, so each month is taken from a single file
+    rather than summed: the file with the most rows in that month (the later file on ties).
+    Adding a file therefore only needs that file's own monthly aggregates.
+    """
+    merged = LedgerSummary()
+    sources = {}
+    for summary in summaries:
+        for month_key, count in summary.monthly_row_counts.items():
+            if count >= sources.get(month_key, (0, None))[0]:
+                sources[month_key] = (count, summary)
+
+    for month_key in sorted(sources):
+        count, summary = sources[month_key]
+        merged.monthly_row_counts[month_key] = count
+        merged.row_count += count
+        if month_key in summary.monthly_fx_pl:
+            merged.monthly_fx_pl[month_key] = summary.monthly_fx_pl[month_key]
+        for currency, rates in summary.month_end_rates.items():
+            if month_key in rates:
+                merged.month_end_rates.setdefault(currency, {})[month_key] = rates[month_key]
+    return merged
+
+
+def _is_xlsx(file_bytes):
+    # .xlsx workbooks are zip archives; legacy .xls files cannot be read by openpyxl
+    return file_bytes[:2] == b'PK'
+
+
+def _report(progress, stage_name, rows_read=None, total_rows=None):
+    if progress is not None:
+        progress(stage_name, rows_read, total_rows)
+
+
+def iter_ledger_chunks(file_bytes, chunk_rows=STREAM_CHUNK_ROWS, progress=None):
+    """
+    Streams an .xlsx ledger with openpyxl's read-only mode and yields normalized
+    DataFrame chunks holding only the required columns.
+
+    The header row is located in the same pass as the data, so the workbook is
+    read exactly once and at most `chunk_rows` rows are materialized at a time.
+    `progress(stage, rows_read, total_rows)` is called at the header search and after every
+    chunk; `total_rows` is the sheet's recorded dimension, or None if the file has none.
+    Raises LedgerHeaderError if the header row cannot be found.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        _report(progress, 'header')
+        required_lower = [col.lower() for col in REQUIRED_COLUMNS]
+
+        column_positions = None
+        for row_number, row in enumerate(rows):
+            if row_number >= HEADER_SEARCH_ROWS:
+                break
+            row_values = [str(x).strip().lower() for x in row]
+            if all(col in row_values for col in required_lower):
+                column_positions = [row_values.index(col) for col in required_lower]
+                break
+        if column_positions is None:
+            raise LedgerHeaderError("required ledger columns not found")
+
+        # Files written without a sheet dimension (or a stale one) give no usable total
+        total_rows = sheet.max_row - row_number - 1 if sheet.max_row and sheet.max_row > row_number + 1 else None
+        rows_read = 0
+        _report(progress, 'rows', rows_read, total_rows)
+        buffers = [[] for _ in REQUIRED_COLUMNS]
+        for row in rows:
+            values = [row[pos] if pos < len(row) else None for pos in column_positions]
+            if all(value is None for value in values):
+                continue
+            for buffer, value in zip(buffers, values):
+                buffer.append(value)
+            if len(buffers[0]) >= chunk_rows:
+                rows_read += len(buffers[0])
+                yield normalize_ledger(pd.DataFrame(dict(zip(REQUIRED_COLUMNS, buffers))))
+                _report(progress, 'rows', rows_read, total_rows)
+                buffers = [[] for _ in REQUIRED_COLUMNS]
+        if buffers[0]:
+            rows_read += len(buffers[0])
+            yield normalize_ledger(pd.DataFrame(dict(zip(REQUIRED_COLUMNS, buffers))))
+            _report(progress, 'rows', rows_read, total_rows)
+    finally:
+        workbook.close()
+
+
+def ledger_chunks(file_bytes, chunk_rows=STREAM_CHUNK_ROWS, progress=None):
+    """
+    Yields normalized chunks of any uploaded ledger: .xlsx workbooks are streamed and
+    legacy .xls workbooks fall back to the full DataFrame reader (a single chunk).
+    """
+    if _is_xlsx(file_bytes):
+        yield from iter_ledger_chunks(file_bytes, chunk_rows, progress)
+    else:
+        _report(progress, 'read_excel')
+        df_ledger = parse_ledger(file_bytes)
+        _report(progress, 'rows', len(df_ledger), len(df_ledger))
+        yield df_ledger
+
+
+def stream_ledger_summary(file_bytes, chunk_rows=STREAM_CHUNK_ROWS, progress=None):
+    """Aggregates a ledger chunk by chunk so peak memory does not grow with the file."""
+    summary = LedgerSummary()
+    with stage('streamed ledger read') as record:
+        for df_chunk in ledger_chunks(file_bytes, chunk_rows, progress):
+            summary.add_chunk(df_chunk)
+        record.rows = summary.row_count
+    return summary
+
+
+def _ingest_file(store_path, file_bytes, progress=None):
+    # Process-pool worker: streams one file into the store through its own connection,
+    # so only the small summary is sent back to the parent process
+    from store import LedgerStore
+
+    ledger_store = LedgerStore(store_path)
+    try:
+        return ledger_store.ingest_ledger(file_digest(file_bytes), ledger_chunks(file_bytes, progress=progress))
+    finally:
+        ledger_store.close()
+
+
+# Progress queue of a background-job worker process, set by _init_job_worker
+_job_progress = None
+
+
+def _init_job_worker(progress_queue):
+    global _job_progress
+    _job_progress = progress_queue
+
+
+def _run_job_worker(digest, file_bytes, store_path):
+    # Background-job worker process: streams one file (into the store when `store_path` is given)
+    # and sends every progress report to the parent, which applies it to the job (see LedgerCache._relay_progress)
+    def progress(stage_name, rows_read=None, total_rows=None):
+        _job_progress.put((digest, stage_name, rows_read, total_rows))
+
+    if store_path is None:
+        return stream_ledger_summary(file_bytes, progress=progress)
+    return _ingest_file(store_path, file_bytes, progress)
+
+
+class IngestionJob:
+    """
+    Background parse of one uploaded ledger, started by LedgerCache.submit().
+
+    `stage` is 'queued', 'header' (looking for the header row), 'read_excel' (legacy .xls
+    workbooks read as a whole), 'rows' (streaming rows), 'done' or 'failed';
+    `rows_read` and `total_rows` are updated from the worker's progress reports as chunks are read.
+    """
+
+    def __init__(self, digest, summary=None):
+        self.digest = digest
+        self.summary = summary
+        self.error = None
+        self.stage = 'done' if summary is not None else 'queued'
+        self.rows_read = summary.row_count if summary is not None else 0
+        self.total_rows = None
+
+    def report(self, stage_name, rows_read=None, total_rows=None):
+        self.stage = stage_name
+        if rows_read is not None:
+            self.rows_read = rows_read
+        if total_rows is not None:
+            self.total_rows = total_rows
+
+    @property
+    def finished(self):
+        return self.stage in ('done', 'failed')
+
+    @property
+    def failed(self):
+        return self.stage == 'failed'
+
+    @property
+    def fraction(self):
+        """Share of the rows read, or None while the row count is unknown."""
+        if self.stage == 'done':
+            return 1.0
+        if not self.total_rows:
+            return None
+        return min(self.rows_read / self.total_rows, 1.0)
+
+
+class LedgerCache:
+    """
+    Bounded in-process cache of normalized ledgers keyed by file digest.
+
+    The least recently used entry is evicted once `max_entries` is exceeded.
+    Monthly summaries are small and kept separately, up to `max_summaries` files.
+    If `cache_dir` is given, each parsed ledger is also written there as Parquet, and every
+    summary (including those of streamed files, which are never held as a frame) as JSON,
+    so a restarted server can reload them without parsing the workbook again.
+    If `store` (a store.LedgerStore) is given, summaries are read from its
+    pre-aggregated monthly tables and new files are appended to it.
+    Cached frames are shared between reruns and sessions and must not be mutated.
+    """
+
+    def __init__(self, max_entries=8, cache_dir=None, stream_threshold=STREAM_THRESHOLD_BYTES, max_summaries=256,
+                 store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self.max_summaries = max_summaries
+        self.cache_dir = cache_dir
+        self.stream_threshold = stream_threshold
+        self._entries = OrderedDict()
+        self._summaries = OrderedDict()
+        self._jobs = {}
+        # Background jobs run in worker processes, since Excel parsing holds the GIL; the pool is
+        # spawned on the first job. Files of an in-memory store are parsed on threads instead.
+        self._job_pool = None
+        self._progress_queue = None
+        self._executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix='ledger-ingest')
+        self._lock = threading.Lock()
+
+    def _disk_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.v{LEDGER_SCHEMA_VERSION}.parquet")
+
+    def _read_disk(self, digest):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(digest)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except (ImportError, ValueError, OSError):
+            # A missing Parquet engine or a corrupt file just means we parse again
+            return None
+
+    def _write_disk(self, digest, df_ledger):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._disk_path(digest) + ".tmp"
+            df_ledger.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self._disk_path(digest))
+        except (ImportError, ValueError, TypeError, NotImplementedError, OSError):
+            # The on-disk copy is best effort; mixed-type extra columns may not serialize
+            pass
+
+    def _summary_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.v{LEDGER_SCHEMA_VERSION}.summary.json")
+
+    def _read_summary_disk(self, digest):
+        # Streamed files are never held as a frame, so only their summary can be kept on disk
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._summary_path(digest), encoding='utf-8') as f:
+                return LedgerSummary(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            # A missing or corrupt copy just means we parse again
+            return None
+
+    def _write_summary_disk(self, digest, summary):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._summary_path(digest) + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'monthly_fx_pl': summary.monthly_fx_pl,
+                    'month_end_rates': summary.month_end_rates,
+                    'monthly_row_counts': summary.monthly_row_counts,
+                    'row_count': summary.row_count,
+                }, f)
+            os.replace(tmp_path, self._summary_path(digest))
+        except (TypeError, ValueError, OSError):
+            # The on-disk copy is best effort
+            pass
+
+    def _remember(self, digest, df_ledger):
+        with self._lock:
+            self._entries[digest] = df_ledger
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, digest):
+        """Returns the cached ledger for `digest`, or None if it is not cached."""
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return self._entries[digest]
+        df_ledger = self._read_disk(digest)
+        if df_ledger is not None:
+            self._remember(digest, df_ledger)
+        return df_ledger
+
+    def load(self, file_bytes):
+        """Returns the normalized ledger for `file_bytes`, parsing it only on a cache miss."""
+        digest = file_digest(file_bytes)
+        df_ledger = self.get(digest)
+        if df_ledger is None:
+            df_ledger = parse_ledger(file_bytes)
+            self._write_disk(digest, df_ledger)
+            self._remember(digest, df_ledger)
+        return df_ledger
+
+    def summary(self, file_bytes, progress=None):
+        """
+        Returns the LedgerSummary for `file_bytes`.
+        Workbooks above `stream_threshold` bytes are streamed and never held as a full DataFrame.
+        So are workbooks summarized with a `progress` callback, which is passed on to the chunk
+        reader (see iter_ledger_chunks) and reports the rows read as they are streamed.
+        """
+        digest = file_digest(file_bytes)
+        with self._lock:
+            if digest in self._summaries:
+                self._summaries.move_to_end(digest)
+                return self._summaries[digest]
+
+        if self.store is not None:
+            # Stored files are read from the monthly tables; new files are parsed and appended
+            summary = self.store.ingest_ledger(digest, ledger_chunks(file_bytes, progress=progress))
+        else:
+            summary = self._read_summary_disk(digest)
+            if summary is None:
+                if len(file_bytes) >= self.stream_threshold or (progress is not None and self.get(digest) is None):
+                    # Background jobs stream every uncached workbook so they can report the rows read
+                    summary = stream_ledger_summary(file_bytes, progress=progress)
+                else:
+                    summary = summarize_ledger(self.load(file_bytes))
+                self._write_summary_disk(digest, summary)
+        self._remember_summary(digest, summary)
+        return summary
+
+    def submit(self, file_bytes):
+        """
+        Starts summarizing `file_bytes` in a background worker process and returns its IngestionJob.
+
+        Jobs are keyed by file digest and shared by every session using the cache: a file that is
+        already summarized returns a finished job, and one that is queued or being parsed returns
+        the running job instead of starting another. A failed job is retried on the next submit.
+        """
+        digest = file_digest(file_bytes)
+        with self._lock:
+            if digest in self._summaries:
+                self._summaries.move_to_end(digest)
+                return IngestionJob(digest, summary=self._summaries[digest])
+            job = self._jobs.get(digest)
+            if job is not None and not job.failed:
+                return job
+            job = IngestionJob(digest)
+            self._jobs[digest] = job
+
+        if self.store is not None and self.store.path == ':memory:':
+            # An in-memory store cannot be opened by worker processes
+            self._executor.submit(self._run_job, job, file_bytes)
+            return job
+        summary = self.store.ledger_summary(digest) if self.store is not None else self._read_summary_disk(digest)
+        if summary is not None:
+            self._finish_job(job, summary)
+            return job
+        store_path = self.store.path if self.store is not None else None
+        pool = self._start_job_pool()
+        future = pool.submit(_run_job_worker, digest, file_bytes, store_path)
+        future.add_done_callback(lambda done: self._collect_job(job, done, pool))
+        return job
+
+    def _start_job_pool(self):
+        with self._lock:
+            if self._job_pool is None:
+                self._progress_queue = WORKER_CONTEXT.Queue()
+                self._job_pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=WORKER_CONTEXT,
+                                                     initializer=_init_job_worker, initargs=(self._progress_queue,))
+                threading.Thread(target=self._relay_progress, args=(self._progress_queue,), name='ledger-progress',
+                                 daemon=True).start()
+            return self._job_pool
+
+    def _relay_progress(self, progress_queue):
+        # Applies the progress reports of the worker processes to their jobs, until the pool is replaced
+        while True:
+            report = progress_queue.get()
+            if report is None:
+                return
+            digest, stage_name, rows_read, total_rows = report
+            with self._lock:
+                job = self._jobs.get(digest)
+            # Reports still queued when the job was collected are stale
+            if job is not None and not job.finished:
+                job.report(stage_name, rows_read, total_rows)
+
+    def _collect_job(self, job, future, pool):
+        try:
+            summary = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. killed when out of memory); the next job spawns a new pool
+                with self._lock:
+                    if self._job_pool is pool:
+                        self._progress_queue.put(None)
+                        self._job_pool = None
+            self._fail_job(job, e)
+            return
+        if self.store is None:
+            self._write_summary_disk(job.digest, summary)
+        self._finish_job(job, summary)
+
+    def _run_job(self, job, file_bytes):
+        try:
+            summary = self.summary(file_bytes, progress=job.report)
+        except Exception as e:
+            self._fail_job(job, e)
+            return
+        self._finish_job(job, summary)
+
+    def _finish_job(self, job, summary):
+        self._remember_summary(job.digest, summary)
+        job.summary = summary
+        job.report('done', summary.row_count)
+        with self._lock:
+            # Finished summaries are served from the summary cache from now on
+            if self._jobs.get(job.digest) is job:
+                del self._jobs[job.digest]
+
+    def _fail_job(self, job, error):
+        # Surfaced to the page through the job; the upload handler shows the message
+        job.error = error
+        job.report('failed')
+
+    def _remember_summary(self, digest, summary):
+        with self._lock:
+            self._summaries[digest] = summary
+            self._summaries.move_to_end(digest)
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+
+    def summaries(self, files_bytes, max_workers=None):
+        """
+        Returns the LedgerSummary of every file in `files_bytes`, in order.
+
+        Only files that are not cached yet are parsed; when there are several of them, together at
+        least PARALLEL_PARSE_BYTES, they are parsed in parallel in a process pool, since Excel
+        parsing is CPU-bound.
+        With a store, every worker appends its file to the store itself, so parsed rows are
+        never collected in this process.
+        """
+        digests = [file_digest(file_bytes) for file_bytes in files_bytes]
+        results = {}
+        pending = {}
+        with self._lock:
+            for digest, file_bytes in zip(digests, files_bytes):
+                if digest in self._summaries:
+                    self._summaries.move_to_end(digest)
+                    results[digest] = self._summaries[digest]
+                else:
+                    pending[digest] = file_bytes
+
+        for digest in list(pending):
+            stored = self.store.ledger_summary(digest) if self.store is not None else self._read_summary_disk(digest)
+            if stored is not None:
+                self._remember_summary(digest, stored)
+                results[digest] = stored
+                del pending[digest]
+
+        in_memory_store = self.store is not None and self.store.path == ':memory:'
+        if len(pending) == 1 or in_memory_store or sum(map(len, pending.values())) < PARALLEL_PARSE_BYTES:
+            # An in-memory store cannot be opened by worker processes, so its files are streamed in one by one
+            for digest, file_bytes in pending.items():
+                results[digest] = self.summary(file_bytes)
+        elif pending:
+            workers = min(len(pending), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as executor:
+                if self.store is not None:
+                    # Workers stream their file into the store themselves, one file per transaction
+                    summaries = executor.map(_ingest_file, [self.store.path] * len(pending), pending.values())
+                else:
+                    summaries = executor.map(stream_ledger_summary, pending.values())
+                for digest, summary in zip(pending, summaries):
+                    if self.store is None:
+                        self._write_summary_disk(digest, summary)
+                    self._remember_summary(digest, summary)
+                    results[digest] = summary
+        return [results[digest] for digest in digests]
+
+    def memory_report(self):
+        """Returns the resident memory of every cached ledger (most recently used last)."""
+        with self._lock:
+            entries = list(self._entries.items())
+        return pd.DataFrame(
+            [(digest[:12], len(df_ledger), int(df_ledger.memory_usage(index=True, deep=True).sum()))
+             for digest, df_ledger in entries],
+            columns=['digest', 'rows', 'bytes'],
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._summaries.clear()
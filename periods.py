@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+from schedule import closing_calendar, month_ordinals
+
+
+def month_ordinal(year, month):
+    """Returns a month counter (year * 12 + month - 1) so month arithmetic becomes integer arithmetic."""
+    return year * 12 + month - 1
+
+
+def ordinal_to_month_key(ordinal):
+    return f"{ordinal // 12}-{ordinal % 12 + 1:02d}"
+
+
+def month_key_to_ordinal(month_key):
+    return month_ordinal(int(month_key[:4]), int(month_key[5:7]))
+
+
+def month_key_to_label(month_key):
+    """Converts a 'YYYY-MM' key to the '2025년 3월' label used on the charts."""
+    return f"{int(month_key[:4])}년 {int(month_key[5:7])}월"
+
+
+@dataclass(frozen=True)
+class PeriodIndex:
+    """
+    Consecutive settlement months shared by every section of the dashboard.
+
+    Each position carries the month ordinal, the 'YYYY-MM' key used for
+    session state and ledger lookups, the closing date (the month's last
+    business day, see schedule.closing_calendar), the '2025년 3월' display
+    label and whether it is the contract's expiry month.
+    """
+    ordinals: np.ndarray
+    month_keys: tuple
+    closing_dates: tuple
+    labels: tuple
+    is_expiry: np.ndarray
+    positions: dict = field(repr=False)
+
+    def __len__(self):
+        return len(self.month_keys)
+
+    def locate(self, month_key):
+        """Returns the position of `month_key`, or None if it is outside the index."""
+        return self.positions.get(month_key)
+
+    @property
+    def editor_labels(self):
+        """Labels used in the forward-rate editor ('2025년 3월말')."""
+        return tuple(f"{label}말" for label in self.labels)
+
+
+def _build_index(first_ordinal, last_ordinal, expiry_ordinal):
+    ordinals = np.arange(first_ordinal, last_ordinal + 1, dtype=np.int64)
+    month_keys = tuple(ordinal_to_month_key(int(ordinal)) for ordinal in ordinals)
+    labels = tuple(f"{int(ordinal) // 12}년 {int(ordinal) % 12 + 1}월" for ordinal in ordinals)
+    # Closing dates of every month in one vectorized roll over the holiday calendar
+    closing_dates = closing_calendar().last_business_days((ordinals - 1970 * 12).astype('datetime64[M]'))
+    is_expiry = ordinals == expiry_ordinal
+
+    # Cached indexes are shared between reruns, so the arrays are made read-only
+    ordinals.flags.writeable = False
+    is_expiry.flags.writeable = False
+    return PeriodIndex(
+        ordinals=ordinals,
+        month_keys=month_keys,
+        closing_dates=tuple(closing_dates.tolist()),
+        labels=labels,
+        is_expiry=is_expiry,
+        positions={key: i for i, key in enumerate(month_keys)},
+    )
+
+
+@lru_cache(maxsize=256)
+def contract_periods(start_date, maturity_date):
+    """
+    Returns the PeriodIndex from the month of `start_date` through the month of `maturity_date`
+    (see schedule.maturity_dates); the last position is flagged as the expiry month.
+    """
+    first, expiry = (int(ordinal) for ordinal in month_ordinals([start_date, maturity_date]))
+    return _build_index(first, expiry, expiry)
+
+
+@lru_cache(maxsize=256)
+def period_range(first_ordinal, last_ordinal):
+    """Returns the PeriodIndex covering the months between two ordinals (inclusive), without expiry flags."""
+    return _build_index(first_ordinal, last_ordinal, None)
@@ -0,0 +1,296 @@
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from periods import month_ordinal, period_range
+from schedule import MODIFIED_FOLLOWING, day_count_fraction, maturity_dates, month_ordinals
+
+# Columns expected in an uploaded contract book (same labels as the sidebar inputs)
+BOOK_COLUMNS = ['선도환거래종류', '거래금액($)', '계약환율', '계약 시작일자', '기일물']
+
+# Optional column holding the realized spot rate at maturity
+EXPIRY_SPOT_COLUMN = '만기 시점 현물환율'
+
+# Maturity date scheduled from 계약 시작일자 and 기일물 on the settlement calendar
+MATURITY_COLUMN = '만기일자'
+
+# ACT/365 year fraction from 계약 시작일자 to 만기일자
+YEAR_FRACTION_COLUMN = '계약기간(년)'
+
+# P&L sign per transaction type: 선매도 gains when the rate falls below the contract rate
+DIRECTION_SIGNS = {'선매도': 1, '선매수': -1}
+
+
+class ContractBookError(ValueError):
+    """Raised when an uploaded contract book is missing columns or has invalid values."""
+
+
+def tenor_to_months(tenors):
+    """
+    Converts a Series of tenors ('3개월물', '1년물' or a plain number of months) to month counts.
+    Raises ContractBookError for values that cannot be interpreted.
+    """
+    text = tenors.astype(str).str.strip()
+    parts = text.str.extract(r'^(\d+)\s*(개월물|년물)?$')
+    counts = pd.to_numeric(parts[0], errors='coerce')
+    months = counts.where(parts[1] != '년물', counts * 12)
+    if months.isna().any() or (months <= 0).any():
+        invalid = text[months.isna() | (months <= 0)].unique()[:5]
+        raise ContractBookError(f"invalid tenor values: {', '.join(invalid)}")
+    return months.astype(np.int64)
+
+
+def normalize_contract_book(df_book, convention=MODIFIED_FOLLOWING):
+    """
+    Validates a contract book and adds the columns the engine works on: 'sign' (+1 선매도 / -1 선매수),
+    '만기일자' (the tenor added to 계약 시작일자 and rolled to a USD/KRW business day by `convention`),
+    '계약기간(년)' (its ACT/365 year fraction), 'start_ordinal' and 'expiry_ordinal' (the month of 만기일자).
+    """
+    df_book = df_book.copy()
+    df_book.columns = [str(col).strip() for col in df_book.columns]
+    missing = [col for col in BOOK_COLUMNS if col not in df_book.columns]
+    if missing:
+        raise ContractBookError(f"missing columns: {', '.join(missing)}")
+
+    df_book = df_book.dropna(subset=BOOK_COLUMNS, how='all').reset_index(drop=True)
+
+    df_book['선도환거래종류'] = df_book['선도환거래종류'].astype(str).str.strip()
+    df_book['sign'] = df_book['선도환거래종류'].map(DIRECTION_SIGNS)
+    if df_book['sign'].isna().any():
+        raise ContractBookError("선도환거래종류 must be 선매도 or 선매수")
+    df_book['sign'] = df_book['sign'].astype(np.int8)
+
+    for col in ('거래금액($)', '계약환율'):
+        values = pd.to_numeric(df_book[col], errors='coerce')
+        invalid = values.isna() | (values <= 0)
+        if invalid.any():
+            # A missing amount or rate would silently value the contract at 0
+            rows = ', '.join(str(row + 1) for row in np.flatnonzero(invalid.to_numpy())[:5])
+            raise ContractBookError(f"{col} must be a positive number (rows {rows})")
+        df_book[col] = values.astype(np.float64)
+    if EXPIRY_SPOT_COLUMN in df_book.columns:
+        df_book[EXPIRY_SPOT_COLUMN] = pd.to_numeric(df_book[EXPIRY_SPOT_COLUMN], errors='coerce')
+    else:
+        df_book[EXPIRY_SPOT_COLUMN] = np.nan
+
+    start_dates = pd.to_datetime(df_book['계약 시작일자'], errors='coerce')
+    if start_dates.isna().any():
+        raise ContractBookError("계약 시작일자 contains invalid dates")
+    df_book['계약 시작일자'] = start_dates
+    # Every contract is scheduled in one vectorized pass over the holiday calendar
+    maturities = maturity_dates(start_dates, tenor_to_months(df_book['기일물']).to_numpy(), convention=convention)
+    df_book[MATURITY_COLUMN] = pd.to_datetime(maturities)
+    df_book[YEAR_FRACTION_COLUMN] = day_count_fraction(start_dates, maturities)
+    df_book['start_ordinal'] = month_ordinal(start_dates.dt.year, start_dates.dt.month).astype(np.int64)
+    df_book['expiry_ordinal'] = month_ordinals(maturities)
+    return df_book
+
+
+def load_contract_book(file_bytes, filename, convention=MODIFIED_FOLLOWING):
+    """Reads a contract book from CSV or Excel bytes and normalizes it."""
+    if filename.lower().endswith('.csv'):
+        df_book = pd.read_csv(io.BytesIO(file_bytes))
+    else:
+        df_book = pd.read_excel(io.BytesIO(file_bytes))
+    return normalize_contract_book(df_book, convention)
+
+
+def single_contract_book(transaction_type, amount_usd, contract_rate, start_date, months, end_spot_rate,
+                         convention=MODIFIED_FOLLOWING):
+    """Builds a one-row normalized book from the sidebar inputs."""
+    return normalize_contract_book(pd.DataFrame({
+        '선도환거래종류': [transaction_type],
+        '거래금액($)': [amount_usd],
+        '계약환율': [contract_rate],
+        '계약 시작일자': [pd.Timestamp(start_date)],
+        '기일물': [months],
+        EXPIRY_SPOT_COLUMN: [end_spot_rate],
+    }), convention)
+
+
+def contract_pl(transaction_type, amount_usd, contract_rate, rate):
+    """
+    Returns the P&L in 원 of one contract valued (or settled) at `rate`:
+    (계약환율 - rate) x 거래금액 for 선매도 and the opposite for 선매수.
+    """
+    return DIRECTION_SIGNS[transaction_type] * (contract_rate - rate) * amount_usd
+
+
+@dataclass
+class PortfolioPL:
+    """
+    Contract x settlement-month P&L matrices (in 원).
+
+    `valuation` holds month-end 평가손익 for months before expiry and
+    `settlement` holds 거래손익 in each contract's expiry month; all other cells are 0.
+    """
+    month_keys: list
+    valuation: np.ndarray
+    settlement: np.ndarray
+
+    def monthly_totals(self):
+        """Returns per-month totals indexed by 'YYYY-MM'."""
+        valuation = self.valuation.sum(axis=0)
+        settlement = self.settlement.sum(axis=0)
+        return pd.DataFrame({
+            '평가손익': valuation,
+            '거래손익': settlement,
+            '파생상품 손익': valuation + settlement,
+        }, index=pd.Index(self.month_keys, name='month_key'))
+
+
+def monthly_pl_table(totals, monthly_fx_pl):
+    """
+    Adds the ledger's 외화환산손익 (`monthly_fx_pl`, keyed 'YYYY-MM'; 0 for months without postings)
+    and '순손익' (파생상품 손익 + 외화환산손익) to the per-month totals of a book.
+    """
+    table = totals.copy()
+    table['외화환산손익'] = np.array([monthly_fx_pl.get(key, 0.0) for key in table.index], dtype=np.float64)
+    table['순손익'] = table['파생상품 손익'] + table['외화환산손익']
+    return table
+
+
+def book_periods(df_book):
+    """Returns the PeriodIndex from the earliest start month to the latest expiry month of the book."""
+    return period_range(int(df_book['start_ordinal'].min()), int(df_book['expiry_ordinal'].max()))
+
+
+def month_rates(periods, forward_rates):
+    """Returns the forward rate of every month of `periods` from a {'YYYY-MM': rate} mapping (0 where missing)."""
+    rates = np.array([forward_rates.get(key, np.nan) for key in periods.month_keys], dtype=np.float64)
+    return np.nan_to_num(rates, nan=0.0)
+
+
+def _contract_terms(df_book):
+    # Per-contract columns shaped (contracts, 1) to broadcast against months
+    return (
+        df_book['start_ordinal'].to_numpy()[:, None],
+        df_book['expiry_ordinal'].to_numpy()[:, None],
+        (df_book['sign'].to_numpy() * df_book['거래금액($)'].to_numpy())[:, None],
+        df_book['계약환율'].to_numpy()[:, None],
+        df_book[EXPIRY_SPOT_COLUMN].to_numpy(dtype=np.float64)[:, None],
+    )
+
+
+def _value_months(terms, months, rates):
+    # Contract x month 평가손익 and 거래손익 for the month ordinals `months` valued at `rates`
+    start, expiry, signed_amount, contract_rate, expiry_spot = terms
+    is_valued = (months >= start) & (months < expiry)
+    is_expiry = months == expiry
+
+    valuation = np.where(is_valued, signed_amount * (contract_rate - rates), 0.0)
+
+    settlement_rate = np.where(np.isnan(expiry_spot), rates, expiry_spot)
+    settlement = np.where(is_expiry, signed_amount * (contract_rate - settlement_rate), 0.0)
+    return valuation, settlement
+
+
+def compute_portfolio_pl(df_book, periods, forward_rates):
+    """
+    Values every contract in `df_book` at every month of the PeriodIndex `periods` in one broadcast.
+
+    `forward_rates` maps 'YYYY-MM' to the expected month-end forward rate. Contracts are
+    valued at that rate in months before expiry; in the expiry month they settle at their
+    '만기 시점 현물환율', falling back to the month's forward rate when none is given.
+    """
+    valuation, settlement = _value_months(
+        _contract_terms(df_book), periods.ordinals, month_rates(periods, forward_rates)
+    )
+    return PortfolioPL(month_keys=list(periods.month_keys), valuation=valuation, settlement=settlement)
+
+
+class ScenarioTable:
+    """
+    Month x contract P&L of a book kept between reruns and patched when forward rates change.
+
+    The matrices are stored month-major, so revaluing a month rewrites one contiguous row.
+    `update()` diffs the new rates against the ones the table was valued at and revalues only
+    the changed months, patching their monthly totals; an edit of k forward rates costs
+    O(k x contracts) instead of O(months x contracts).
+    """
+
+    def __init__(self, df_book, periods, forward_rates):
+        self.df_book = df_book
+        self.periods = periods
+        self.rates = month_rates(periods, forward_rates)
+        self._terms = _contract_terms(df_book)
+
+        valuation, settlement = _value_months(self._terms, periods.ordinals, self.rates)
+        self.valuation = np.ascontiguousarray(valuation.T)
+        self.settlement = np.ascontiguousarray(settlement.T)
+        self.valuation_totals = self.valuation.sum(axis=1)
+        self.settlement_totals = self.settlement.sum(axis=1)
+
+    def matches(self, df_book, periods):
+        """Returns True if the table was built for this book and month grid."""
+        return (
+            self.periods.month_keys == periods.month_keys
+            and (self.df_book is df_book or self.df_book.equals(df_book))
+        )
+
+    def update(self, forward_rates):
+        """Revalues the months whose forward rate changed and returns their positions."""
+        rates = month_rates(self.periods, forward_rates)
+        changed = np.flatnonzero(rates != self.rates)
+        if len(changed):
+            valuation, settlement = _value_months(self._terms, self.periods.ordinals[changed], rates[changed])
+            self.valuation[changed] = valuation.T
+            self.settlement[changed] = settlement.T
+            self.valuation_totals[changed] = valuation.sum(axis=0)
+            self.settlement_totals[changed] = settlement.sum(axis=0)
+            self.rates[changed] = rates[changed]
+        return changed
+
+    def monthly_totals(self):
+        """Returns per-month totals indexed by 'YYYY-MM', in the layout of PortfolioPL.monthly_totals()."""
+        return pd.DataFrame({
+            '평가손익': self.valuation_totals,
+            '거래손익': self.settlement_totals,
+            '파생상품 손익': self.valuation_totals + self.settlement_totals,
+        }, index=pd.Index(self.periods.month_keys, name='month_key'))
+
+
+def linear_exposure(df_book, periods):
+    """
+    Decomposes the monthly book P&L as `constant - slope * rate` for a month-end rate `rate`.
+
+    Contract P&L is linear in the rate, so any number of rate scenarios can be valued from
+    these two per-month vectors without revisiting individual contracts. Contracts settling at
+    a given '만기 시점 현물환율' contribute only to `constant` in their expiry month.
+    """
+    months = periods.ordinals
+    start, expiry, signed_amount, contract_rate, expiry_spot = _contract_terms(df_book)
+    has_spot = ~np.isnan(expiry_spot)
+
+    rate_sensitive = ((months >= start) & (months < expiry)) | ((months == expiry) & ~has_spot)
+    fixed_settlement = (months == expiry) & has_spot
+
+    constant = (
+        np.where(rate_sensitive, signed_amount * contract_rate, 0.0)
+        + np.where(fixed_settlement, signed_amount * (contract_rate - np.nan_to_num(expiry_spot)), 0.0)
+    ).sum(axis=0)
+    slope = np.where(rate_sensitive, signed_amount, 0.0).sum(axis=0)
+    return constant, slope
+
+
+def sensitivity_grid(df_book, periods, base_rates, shocks, monthly_fx_pl):
+    """
+    Returns book P&L for every rate shock x settlement month in long form.
+
+    Each month is revalued at `base_rates[m] + shock` for every entry of `shocks` in a single
+    broadcast; '순손익' adds the ledger 외화환산손익 of the month (`monthly_fx_pl`, keyed 'YYYY-MM').
+    """
+    constant, slope = linear_exposure(df_book, periods)
+    shocks = np.asarray(shocks, dtype=np.float64)
+    shocked_rates = np.asarray(base_rates, dtype=np.float64)[None, :] + shocks[:, None]
+    derivative_pl = constant[None, :] - slope[None, :] * shocked_rates
+    fx_pl = np.array([monthly_fx_pl.get(key, 0.0) for key in periods.month_keys], dtype=np.float64)
+
+    return pd.DataFrame({
+        'month_key': np.tile(periods.month_keys, len(shocks)),
+        'shock': np.repeat(shocks, len(periods)),
+        '파생상품 손익': derivative_pl.ravel(),
+        '순손익': (derivative_pl + fx_pl[None, :]).ravel(),
+    })
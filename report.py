@@ -0,0 +1,145 @@
+import tempfile
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from periods import month_key_to_label
+from portfolio import EXPIRY_SPOT_COLUMN, MATURITY_COLUMN, YEAR_FRACTION_COLUMN, monthly_pl_table
+
+MONTHLY_HEADER = ['구분', '결산연월', '예상 통화선도환율', '월말 USD 환율',
+                  '평가손익', '거래손익', '파생상품 손익', '외화환산손익', '순손익']
+
+CONTRACT_HEADER = ['구분', '계약번호', '선도환거래종류', '거래금액($)', '계약환율', '계약 시작일자', MATURITY_COLUMN,
+                   YEAR_FRACTION_COLUMN, EXPIRY_SPOT_COLUMN]
+
+CONTRACT_PL_HEADER = ['구분', '계약번호', '결산연월', '평가손익', '거래손익']
+
+AMOUNT_FORMAT = '#,##0'
+RATE_FORMAT = '#,##0.00'
+
+
+def _sheet(workbook, title, header, widths):
+    # Column widths and the frozen header must be set before the first row of a write-only sheet
+    sheet = workbook.create_sheet(title)
+    for position, width in enumerate(widths, start=1):
+        sheet.column_dimensions[get_column_letter(position)].width = width
+    sheet.freeze_panes = 'A2'
+    bold = Font(bold=True)
+    cells = []
+    for name in header:
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = bold
+        cells.append(cell)
+    sheet.append(cells)
+    return sheet
+
+
+def _formatted(sheet, values, formats):
+    # Wraps the values that have a number format in write-only cells
+    row = []
+    for value, number_format in zip(values, formats):
+        if number_format is None:
+            row.append(value)
+        else:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.number_format = number_format
+            row.append(cell)
+    return row
+
+
+def _write_monthly(workbook, sections, monthly_fx_pl, usd_rates):
+    sheet = _sheet(workbook, '월별 손익', MONTHLY_HEADER, [16, 14, 18, 14] + [18] * 5)
+    formats = [None, None, RATE_FORMAT, RATE_FORMAT] + [AMOUNT_FORMAT] * 5
+    for label, table in sections:
+        pl = monthly_pl_table(table.monthly_totals(), monthly_fx_pl)
+        for position, month_key in enumerate(table.periods.month_keys):
+            rate = float(table.rates[position])
+            sheet.append(_formatted(sheet, [
+                label,
+                table.periods.labels[position],
+                rate if rate > 0 else None,
+                usd_rates.get(month_key),
+                *(float(value) for value in pl.iloc[position][['평가손익', '거래손익', '파생상품 손익', '외화환산손익', '순손익']]),
+            ], formats))
+
+
+def _write_contracts(workbook, sections):
+    sheet = _sheet(workbook, '계약 목록', CONTRACT_HEADER, [16, 10, 14, 16, 12, 14, 14, 14, 18])
+    for label, table in sections:
+        df_book = table.df_book
+        columns = [
+            (np.arange(len(df_book)) + 1).tolist(),
+            df_book['선도환거래종류'].tolist(),
+            df_book['거래금액($)'].astype(float).tolist(),
+            df_book['계약환율'].astype(float).tolist(),
+            df_book['계약 시작일자'].dt.date.tolist(),
+            df_book[MATURITY_COLUMN].dt.date.tolist(),
+            df_book[YEAR_FRACTION_COLUMN].astype(float).tolist(),
+            [None if np.isnan(spot) else spot for spot in df_book[EXPIRY_SPOT_COLUMN].astype(float).tolist()],
+        ]
+        for values in zip(*columns):
+            sheet.append([label, *values])
+
+
+def _write_contract_pl(workbook, sections):
+    # Contract terms are written once in '계약 목록'; this sheet only repeats the contract number
+    sheet = _sheet(workbook, '계약별 손익', CONTRACT_PL_HEADER, [16, 10, 14, 18, 18])
+    for label, table in sections:
+        start = table.df_book['start_ordinal'].to_numpy()
+        expiry = table.df_book['expiry_ordinal'].to_numpy()
+
+        # The month-major matrices are read one month (one contiguous row) at a time and written
+        # straight to the sheet, so no contract x month frame is built for the export
+        for position, ordinal in enumerate(table.periods.ordinals):
+            active = np.flatnonzero((start <= ordinal) & (ordinal <= expiry))
+            month_label = table.periods.labels[position]
+            valuation = table.valuation[position, active].tolist()
+            settlement = table.settlement[position, active].tolist()
+            for contract, valuation_pl, settlement_pl in zip((active + 1).tolist(), valuation, settlement):
+                sheet.append([label, contract, month_label, valuation_pl, settlement_pl])
+
+
+def _write_rates(workbook, ledger_summary):
+    panel = ledger_summary.rate_panel()
+    sheet = _sheet(workbook, '월말 환율', ['결산연월', *panel.columns], [14] + [12] * len(panel.columns))
+    formats = [None] + [RATE_FORMAT] * len(panel.columns)
+    for month_key, rates in zip(panel.index, panel.itertuples(index=False)):
+        sheet.append(_formatted(sheet, [
+            month_key_to_label(month_key), *(None if np.isnan(rate) else float(rate) for rate in rates)
+        ], formats))
+
+
+def write_close_report(target, sections, ledger_summary=None):
+    """
+    Writes the settlement-month report workbook to `target` (a path or binary file object).
+
+    `sections` is a list of (label, portfolio.ScenarioTable) whose already computed matrices are
+    written as they are: '월별 손익' holds the monthly totals with the forward rates the table was
+    valued at, the ledger's month-end USD rate, 외화환산손익 and 순손익; '계약 목록' the terms of every
+    contract and '계약별 손익' its 평가손익/거래손익 in every month of its term.
+    '월말 환율' is the ledger's month x currency closing-rate panel.
+
+    The workbook is created in openpyxl's write-only mode, which streams the rows to temporary
+    files, so memory stays flat however many contracts and months are written.
+    """
+    monthly_fx_pl = ledger_summary.monthly_fx_pl if ledger_summary is not None else {}
+    usd_rates = ledger_summary.usd_month_end_rates if ledger_summary is not None else {}
+
+    workbook = Workbook(write_only=True)
+    _write_monthly(workbook, sections, monthly_fx_pl, usd_rates)
+    _write_contracts(workbook, sections)
+    _write_contract_pl(workbook, sections)
+    if ledger_summary is not None and ledger_summary.currencies:
+        _write_rates(workbook, ledger_summary)
+    workbook.save(target)
+
+
+def close_report_bytes(sections, ledger_summary=None):
+    """Returns the report workbook as bytes, written through a temporary file rather than in memory."""
+    with tempfile.TemporaryFile() as f:
+        write_close_report(f, sections, ledger_summary)
+        f.seek(0)
+        return f.read()
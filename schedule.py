@@ -0,0 +1,134 @@
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Holiday table shipped with the app (calendar, date, name); HOLIDAY_CALENDAR_PATH points to another file
+DEFAULT_HOLIDAY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'holidays.csv')
+
+# USD/KRW forwards settle on days that are business days in both Seoul and New York
+SETTLEMENT_CALENDARS = ('KR', 'US')
+
+# The month-end close follows the Korean calendar
+CLOSING_CALENDARS = ('KR',)
+
+# Business-day conventions for maturities falling on a weekend or holiday (numpy's roll names)
+FOLLOWING = 'following'
+MODIFIED_FOLLOWING = 'modifiedfollowing'
+ROLL_CONVENTIONS = {MODIFIED_FOLLOWING: '수정익영업일', FOLLOWING: '익영업일'}
+
+# Day-count conventions: days between two dates over the year basis
+DAY_COUNT_BASES = {'ACT/365': 365.0, 'ACT/360': 360.0}
+
+
+def as_days(dates):
+    """Converts dates (date objects, datetime64 arrays or a datetime Series) to a datetime64[D] array."""
+    if isinstance(dates, pd.Series):
+        dates = dates.to_numpy()
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+@dataclass(frozen=True, eq=False)
+class HolidayCalendar:
+    """
+    Business days (Mon-Fri except the listed holidays) of one or more holiday calendars.
+
+    `holidays` is the sorted datetime64[D] array of the calendars' holidays and `busdaycal` the numpy
+    calendar built from it once, so rolling any number of dates is a single vectorized call.
+    Only the years `first_year` to `last_year` are listed; outside them just weekends are skipped.
+    Calendars are cached and compared by identity, so they can be passed to cached functions.
+    """
+    names: tuple
+    holidays: np.ndarray
+    first_year: int
+    last_year: int
+    busdaycal: np.busdaycalendar = field(repr=False)
+
+    def covers(self, dates):
+        """Returns True if every date falls within the years of the holiday table."""
+        years = as_days(dates).astype('datetime64[Y]').astype(np.int64) + 1970
+        return bool(np.all((years >= self.first_year) & (years <= self.last_year)))
+
+    def roll(self, dates, convention=MODIFIED_FOLLOWING):
+        """
+        Moves every date that is not a business day to the next one ('following'), or, for
+        'modifiedfollowing', to the previous one when the next would fall in the following month.
+        """
+        return np.busday_offset(as_days(dates), 0, roll=convention, busdaycal=self.busdaycal)
+
+    def last_business_days(self, dates):
+        """Returns the last business day of the month of every date as datetime64[D]. NaT stays NaT."""
+        month_ends = (as_days(dates).astype('datetime64[M]') + 1).astype('datetime64[D]') - 1
+        return np.busday_offset(month_ends, 0, roll='backward', busdaycal=self.busdaycal)
+
+
+@lru_cache(maxsize=16)
+def _read_holidays(path):
+    df_holidays = pd.read_csv(path, usecols=['calendar', 'date'], dtype={'calendar': str, 'date': str})
+    return df_holidays['calendar'].str.strip().str.upper().to_numpy(), as_days(df_holidays['date'].str.strip())
+
+
+@lru_cache(maxsize=16)
+def _build_calendar(names, path):
+    calendars, dates = _read_holidays(path)
+    holidays = np.unique(dates[np.isin(calendars, names)])
+    years = holidays.astype('datetime64[Y]').astype(np.int64) + 1970
+    holidays.flags.writeable = False
+    return HolidayCalendar(
+        names=names,
+        holidays=holidays,
+        first_year=int(years.min()) if len(years) else 0,
+        last_year=int(years.max()) if len(years) else -1,
+        busdaycal=np.busdaycalendar(holidays=holidays),
+    )
+
+
+def holiday_calendar(names=SETTLEMENT_CALENDARS, path=None):
+    """
+    Returns the HolidayCalendar whose holidays are those of every calendar in `names` (a day is a
+    business day only if it is one in all of them), read from `path`, HOLIDAY_CALENDAR_PATH or the
+    bundled holidays.csv. Each file is read once and each combination of calendars is built once.
+    """
+    path = path or os.environ.get('HOLIDAY_CALENDAR_PATH') or DEFAULT_HOLIDAY_PATH
+    return _build_calendar(tuple(name.upper() for name in names), path)
+
+
+def closing_calendar():
+    """Returns the calendar whose last business day of each month is the month-end close."""
+    return holiday_calendar(CLOSING_CALENDARS)
+
+
+def add_months(dates, months):
+    """
+    Adds `months` to every date, keeping the day of the month where it exists and using the
+    month's last day otherwise (January 31st plus one month is February 28th or 29th).
+    """
+    dates = as_days(dates)
+    target = dates.astype('datetime64[M]') + np.asarray(months, dtype=np.int64)
+    first_day = target.astype('datetime64[D]')
+    month_length = ((target + 1).astype('datetime64[D]') - first_day).astype(np.int64)
+    day = (dates - dates.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+    return first_day + np.minimum(day, month_length - 1)
+
+
+def maturity_dates(start_dates, months, calendar=None, convention=MODIFIED_FOLLOWING):
+    """
+    Returns the maturity of contracts starting on `start_dates` with tenors of `months` months:
+    the same day `months` later, rolled to a business day of `calendar` (the USD/KRW settlement
+    calendar by default) by `convention`. Every contract of a book is scheduled in one call.
+    """
+    calendar = calendar or holiday_calendar()
+    return calendar.roll(add_months(start_dates, months), convention)
+
+
+def day_count_fraction(start, end, convention='ACT/365'):
+    """Returns the year fraction between `start` and `end` (negative if `end` is earlier)."""
+    days = (as_days(end) - as_days(start)).astype(np.int64)
+    return days / DAY_COUNT_BASES[convention]
+
+
+def month_ordinals(dates):
+    """Returns the month ordinal (year * 12 + month - 1, see periods.month_ordinal) of every date."""
+    return as_days(dates).astype('datetime64[M]').astype(np.int64) + 1970 * 12
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from periods import month_key_to_ordinal, month_ordinal
+from portfolio import linear_exposure
+from schedule import day_count_fraction
+
+# Paths generated per chunk; bounds the size of the random-number arrays held at once
+CHUNK_PATHS = 20_000
+
+# Above this many path x month cells the chunks are spread over a process pool
+PARALLEL_THRESHOLD_CELLS = 8_000_000
+
+# Most path x month cells simulated in one run; the month x path P&L matrix (8 bytes per cell)
+# is the only full-size array held, so this bounds the memory of a run (about 128MB)
+MAX_SIMULATION_CELLS = 16_000_000
+
+# Pool processes are spawned rather than forked from the multithreaded server (see ledger.WORKER_CONTEXT)
+WORKER_CONTEXT = multiprocessing.get_context('spawn')
+
+SIMULATION_METHODS = ('gbm', 'bootstrap')
+
+# Confidence levels reported as VaR/CVaR
+CONFIDENCE_LEVELS = (0.95, 0.99)
+
+# Percentiles drawn as fan bands
+BAND_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def historical_log_returns(month_end_rates):
+    """
+    Returns demeaned monthly log returns from a {'YYYY-MM': rate} mapping,
+    using only pairs of consecutive months with positive rates.
+    """
+    series = pd.Series(month_end_rates, dtype=np.float64).sort_index()
+    series = series[series > 0]
+    if len(series) < 2:
+        return np.empty(0)
+    ordinals = np.array([month_key_to_ordinal(key) for key in series.index])
+    consecutive = np.diff(ordinals) == 1
+    returns = np.diff(np.log(series.to_numpy()))[consecutive]
+    return returns - returns.mean() if len(returns) else returns
+
+
+def _simulate_chunk(task):
+    """
+    Simulates one chunk of month-end rate paths and revalues the book on each of them.
+    Module-level so it can run in a worker process.
+    """
+    method, n_paths, seed, center_rates, year_fractions, month_steps, volatility, returns, constant, slope = task
+    rng = np.random.default_rng(seed)
+
+    if method == 'gbm':
+        # Brownian motion sampled at each month-end; paths are martingales around the center rates
+        step_variance = np.diff(year_fractions, prepend=0.0)
+        shocks = rng.standard_normal((n_paths, len(year_fractions))) * np.sqrt(step_variance)
+        log_factor = volatility * np.cumsum(shocks, axis=1) - 0.5 * volatility ** 2 * year_fractions
+    else:
+        # Resample historical monthly log returns, one per elapsed month
+        max_steps = int(month_steps.max()) if len(month_steps) else 0
+        draws = returns[rng.integers(0, len(returns), size=(n_paths, max_steps))]
+        cumulative = np.concatenate((np.zeros((n_paths, 1)), np.cumsum(draws, axis=1)), axis=1)
+        log_factor = cumulative[:, month_steps]
+
+    rates = center_rates * np.exp(log_factor)
+    return constant - slope * rates
+
+
+@dataclass
+class SimulationResult:
+    """
+    Distribution of the simulated month-end P&L (in 원) per settlement month.
+
+    Only per-month statistics are kept, not the paths, so a result stays small however many
+    paths were simulated: `expected` (months), `cutoffs` and `tail_means` (one row per entry of
+    CONFIDENCE_LEVELS: the P&L quantile at 1 - level and the mean P&L at or below it) and
+    `bands` (one row per entry of BAND_PERCENTILES).
+    """
+    month_keys: list
+    expected: np.ndarray
+    cutoffs: np.ndarray
+    tail_means: np.ndarray
+    bands: np.ndarray
+
+    def risk_table(self):
+        """Returns expected P&L, VaR and CVaR per settlement month (losses reported as positive numbers)."""
+        table = pd.DataFrame({'기대손익': self.expected}, index=pd.Index(self.month_keys, name='month_key'))
+        for level, cutoff, tail_mean in zip(CONFIDENCE_LEVELS, self.cutoffs, self.tail_means):
+            table[f'VaR {level:.0%}'] = -cutoff
+            table[f'CVaR {level:.0%}'] = -tail_mean
+        return table
+
+    def percentile_bands(self):
+        """Returns the P&L percentiles per month in long form ('month_key', 'percentile', 'pl')."""
+        return pd.DataFrame({
+            'month_key': np.tile(self.month_keys, len(BAND_PERCENTILES)),
+            'percentile': np.repeat(BAND_PERCENTILES, len(self.month_keys)),
+            'pl': self.bands.ravel(),
+        })
+
+
+def summarize_paths(month_keys, pl_by_month):
+    """
+    Reduces a month x path P&L matrix to a SimulationResult. Months are summarized one contiguous
+    row at a time, so no temporary array is larger than one month of paths.
+    """
+    n_months = len(month_keys)
+    expected = np.zeros(n_months)
+    cutoffs = np.zeros((len(CONFIDENCE_LEVELS), n_months))
+    tail_means = np.zeros((len(CONFIDENCE_LEVELS), n_months))
+    bands = np.zeros((len(BAND_PERCENTILES), n_months))
+    for month, pl in enumerate(pl_by_month):
+        if not len(pl):
+            continue
+        expected[month] = pl.mean()
+        bands[:, month] = np.percentile(pl, BAND_PERCENTILES)
+        for i, level in enumerate(CONFIDENCE_LEVELS):
+            cutoffs[i, month] = np.quantile(pl, 1 - level)
+            tail_means[i, month] = pl[pl <= cutoffs[i, month]].mean()
+    return SimulationResult(month_keys=list(month_keys), expected=expected, cutoffs=cutoffs,
+                            tail_means=tail_means, bands=bands)
+
+
+def simulate_book_pl(df_book, periods, center_rates, valuation_date, n_paths, seed,
+                     method='gbm', volatility=0.1, month_end_history=None, max_workers=None):
+    """
+    Simulates `n_paths` USD/KRW paths over the month grid of `periods` and returns the book P&L per path.
+
+    Paths are centered on `center_rates` (one expected month-end rate per month) and are either
+    geometric Brownian motion with annual `volatility` or a bootstrap of monthly log returns from
+    `month_end_history`. Because contract P&L is linear in the rate, the book is revalued from its
+    per-month exposure, so the cost does not grow with the number of contracts. Paths are generated in
+    fixed chunks seeded from `seed`, giving identical results whether or not a process pool is used.
+    Each chunk is copied into one month x path matrix and only its per-month statistics are returned;
+    runs above MAX_SIMULATION_CELLS path x month cells raise ValueError.
+    """
+    if method not in SIMULATION_METHODS:
+        raise ValueError(f"unknown simulation method: {method}")
+    if n_paths * len(periods) > MAX_SIMULATION_CELLS:
+        raise ValueError(f"at most {MAX_SIMULATION_CELLS // max(len(periods), 1):,} paths can be simulated over {len(periods)} months")
+
+    constant, slope = linear_exposure(df_book, periods)
+    center_rates = np.asarray(center_rates, dtype=np.float64)
+
+    year_fractions = np.clip(day_count_fraction(valuation_date, periods.closing_dates, 'ACT/365'), 0, None)
+    valuation_ordinal = month_ordinal(valuation_date.year, valuation_date.month)
+    month_steps = np.clip(periods.ordinals - valuation_ordinal, 0, None)
+
+    returns = np.empty(0)
+    if method == 'bootstrap':
+        returns = historical_log_returns(month_end_history or {})
+        if len(returns) == 0:
+            raise ValueError("at least two consecutive month-end rates are required for bootstrapping")
+
+    chunk_sizes = [CHUNK_PATHS] * (n_paths // CHUNK_PATHS)
+    if n_paths % CHUNK_PATHS:
+        chunk_sizes.append(n_paths % CHUNK_PATHS)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    tasks = [
+        (method, size, chunk_seed, center_rates, year_fractions, month_steps, volatility, returns, constant, slope)
+        for size, chunk_seed in zip(chunk_sizes, seeds)
+    ]
+
+    pl_by_month = np.empty((len(periods), n_paths))
+    offsets = np.concatenate(([0], np.cumsum(chunk_sizes)))
+    if n_paths * len(periods) > PARALLEL_THRESHOLD_CELLS and len(tasks) > 1:
+        workers = min(len(tasks), max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as executor:
+            for offset, chunk in zip(offsets, executor.map(_simulate_chunk, tasks)):
+                pl_by_month[:, offset:offset + len(chunk)] = chunk.T
+    else:
+        for offset, task in zip(offsets, tasks):
+            chunk = _simulate_chunk(task)
+            pl_by_month[:, offset:offset + len(chunk)] = chunk.T
+    return summarize_paths(periods.month_keys, pl_by_month)
@@ -0,0 +1,282 @@
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ledger import LedgerSummary, month_keys
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_files (
+    file_digest TEXT PRIMARY KEY,
+    row_count INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_rows (
+    file_digest TEXT NOT NULL,
+    posted_on TEXT,
+    month_key TEXT,
+    account_name TEXT,
+    account_class TEXT,
+    debit REAL,
+    credit REAL,
+    rate REAL,
+    currency TEXT,
+    fx_pl REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ledger_rows_month ON ledger_rows (month_key);
+CREATE INDEX IF NOT EXISTS ix_ledger_rows_currency_month ON ledger_rows (currency, month_key);
+CREATE INDEX IF NOT EXISTS ix_ledger_rows_file ON ledger_rows (file_digest);
+CREATE TABLE IF NOT EXISTS ledger_rows_staging (
+    ingest_key TEXT NOT NULL,
+    posted_on TEXT,
+    month_key TEXT,
+    account_name TEXT,
+    account_class TEXT,
+    debit REAL,
+    credit REAL,
+    rate REAL,
+    currency TEXT,
+    fx_pl REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ledger_rows_staging_key ON ledger_rows_staging (ingest_key);
+CREATE TABLE IF NOT EXISTS monthly_fx_pl (
+    file_digest TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    fx_pl REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    PRIMARY KEY (file_digest, month_key)
+);
+CREATE INDEX IF NOT EXISTS ix_monthly_fx_pl_month ON monthly_fx_pl (month_key);
+CREATE TABLE IF NOT EXISTS month_end_rates (
+    file_digest TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (file_digest, month_key, currency)
+);
+CREATE INDEX IF NOT EXISTS ix_month_end_rates_currency_month ON month_end_rates (currency, month_key);
+CREATE TABLE IF NOT EXISTS contract_books (
+    book_digest TEXT PRIMARY KEY,
+    filename TEXT,
+    saved_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contracts (
+    book_digest TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    transaction_type TEXT NOT NULL,
+    amount_usd REAL NOT NULL,
+    contract_rate REAL NOT NULL,
+    start_date TEXT NOT NULL,
+    tenor TEXT NOT NULL,
+    expiry_spot_rate REAL,
+    PRIMARY KEY (book_digest, position)
+);
+CREATE TABLE IF NOT EXISTS forward_rates (
+    month_key TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Seconds a connection waits for a write of another process (pool workers ingest files in parallel)
+BUSY_TIMEOUT_SECONDS = 60
+
+# Columns of a ledger row besides its file digest, shared by ledger_rows and ledger_rows_staging
+LEDGER_ROW_COLUMNS = 'posted_on, month_key, account_name, account_class, debit, credit, rate, currency, fx_pl'
+
+# Contract book columns and the store columns they are saved in
+CONTRACT_COLUMNS = {
+    '선도환거래종류': 'transaction_type',
+    '거래금액($)': 'amount_usd',
+    '계약환율': 'contract_rate',
+    '계약 시작일자': 'start_date',
+    '기일물': 'tenor',
+    '만기 시점 현물환율': 'expiry_spot_rate',
+}
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _ledger_rows(key, df_chunk):
+    # Store rows of one normalized ledger chunk, built without holding the store lock
+    return pd.DataFrame({
+        'ingest_key': key,
+        'posted_on': df_chunk['회계일'].dt.strftime('%Y-%m-%d'),
+        'month_key': month_keys(df_chunk['month']),
+        'account_name': df_chunk['계정명'].astype(str),
+        'account_class': df_chunk['account_class'].astype(str),
+        'debit': df_chunk['차변'],
+        'credit': df_chunk['대변'],
+        'rate': df_chunk['환율'],
+        'currency': df_chunk['거래환종'].astype(str).str.upper(),
+        'fx_pl': df_chunk['fx_pl'],
+    })
+
+
+class LedgerStore:
+    """
+    Embedded SQLite store for ledgers, their monthly aggregates, contract books and forward rates.
+
+    Every ingested ledger file is appended under its content digest together with its
+    pre-aggregated monthly tables, so a month-end close only ingests the new file and the
+    dashboard reads monthly figures without grouping raw rows again.
+    The connection is shared between Streamlit sessions and serialized with a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def has_ledger(self, digest):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM ledger_files WHERE file_digest = ?", (digest,)
+            ).fetchone()
+        return row is not None
+
+    def ingest_ledger(self, digest, chunks):
+        """
+        Appends the normalized ledger chunks of one file and its monthly aggregates, and returns
+        the file's LedgerSummary. Files already stored are skipped.
+
+        Chunks are parsed and converted outside the store lock, which is only held while each chunk is
+        appended to a staging table, so other sessions keep reading the store during a long parse.
+        The staged rows, the aggregates and the ledger_files entry are then moved in one transaction,
+        so a file is either stored completely or not at all.
+        """
+        stored = self.ledger_summary(digest)
+        if stored is not None:
+            return stored
+
+        # Each ingest stages under its own key, so two parses of the same file never mix rows
+        ingest_key = uuid.uuid4().hex
+        summary = LedgerSummary()
+        try:
+            for df_chunk in chunks:
+                summary.add_chunk(df_chunk)
+                rows = _ledger_rows(ingest_key, df_chunk)
+                with self._lock, self._conn:
+                    rows.to_sql('ledger_rows_staging', self._conn, if_exists='append', index=False, chunksize=10_000)
+
+            with self._lock, self._conn:
+                # Another session or process may have stored the file while this one was parsing
+                stored = self._read_summary(digest)
+                if stored is not None:
+                    return stored
+                self._conn.execute(
+                    f"INSERT INTO ledger_rows (file_digest, {LEDGER_ROW_COLUMNS}) "
+                    f"SELECT ?, {LEDGER_ROW_COLUMNS} FROM ledger_rows_staging WHERE ingest_key = ? ORDER BY rowid",
+                    (digest, ingest_key),
+                )
+                self._conn.executemany(
+                    "INSERT INTO monthly_fx_pl (file_digest, month_key, fx_pl, row_count) VALUES (?, ?, ?, ?)",
+                    [
+                        (digest, month_key, float(summary.monthly_fx_pl.get(month_key, 0.0)), int(count))
+                        for month_key, count in summary.monthly_row_counts.items()
+                    ],
+                )
+                self._conn.executemany(
+                    "INSERT INTO month_end_rates (file_digest, month_key, currency, rate) VALUES (?, ?, ?, ?)",
+                    [
+                        (digest, month_key, currency, float(rate))
+                        for currency, rates in summary.month_end_rates.items()
+                        for month_key, rate in rates.items()
+                    ],
+                )
+                self._conn.execute(
+                    "INSERT INTO ledger_files (file_digest, row_count, ingested_at) VALUES (?, ?, ?)",
+                    (digest, summary.row_count, _now()),
+                )
+        finally:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM ledger_rows_staging WHERE ingest_key = ?", (ingest_key,))
+        return summary
+
+    def ledger_summary(self, digest):
+        """Returns the stored LedgerSummary of a file from the monthly tables, or None if it is not stored."""
+        with self._lock:
+            return self._read_summary(digest)
+
+    def _read_summary(self, digest):
+        # Callers hold the lock
+        file_row = self._conn.execute(
+            "SELECT row_count FROM ledger_files WHERE file_digest = ?", (digest,)
+        ).fetchone()
+        if file_row is None:
+            return None
+        monthly = self._conn.execute(
+            "SELECT month_key, fx_pl, row_count FROM monthly_fx_pl WHERE file_digest = ? ORDER BY month_key",
+            (digest,),
+        ).fetchall()
+        rates = self._conn.execute(
+            "SELECT currency, month_key, rate FROM month_end_rates WHERE file_digest = ? ORDER BY currency, month_key",
+            (digest,),
+        ).fetchall()
+        month_end_rates = {}
+        for currency, month_key, rate in rates:
+            month_end_rates.setdefault(currency, {})[month_key] = rate
+        return LedgerSummary(
+            monthly_fx_pl={month_key: fx_pl for month_key, fx_pl, _ in monthly},
+            month_end_rates=month_end_rates,
+            monthly_row_counts={month_key: count for month_key, _, count in monthly},
+            row_count=file_row[0],
+        )
+
+    def save_forward_rates(self, rates):
+        """Upserts month-end forward rates ({'YYYY-MM': rate})."""
+        updated_at = _now()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO forward_rates (month_key, rate, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (month_key) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at",
+                [(month_key, float(rate), updated_at) for month_key, rate in rates.items()],
+            )
+
+    def load_forward_rates(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT month_key, rate FROM forward_rates").fetchall())
+
+    def save_contract_book(self, digest, filename, df_book):
+        """Stores the raw columns of a normalized contract book once per file digest."""
+        rows = pd.DataFrame({
+            store_col: df_book[book_col] for book_col, store_col in CONTRACT_COLUMNS.items()
+        })
+        rows['start_date'] = rows['start_date'].dt.strftime('%Y-%m-%d')
+        rows['tenor'] = rows['tenor'].astype(str)
+        rows['expiry_spot_rate'] = rows['expiry_spot_rate'].astype(np.float64).where(rows['expiry_spot_rate'].notna(), None)
+        rows.insert(0, 'position', np.arange(len(rows)))
+        rows.insert(0, 'book_digest', digest)
+
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO contract_books (book_digest, filename, saved_at) VALUES (?, ?, ?)",
+                (digest, filename, _now()),
+            )
+            if cursor.rowcount:
+                rows.to_sql('contracts', self._conn, if_exists='append', index=False, chunksize=10_000)
+
+    def latest_contract_book(self):
+        """Returns (filename, raw contract book DataFrame) of the most recently saved book, or None."""
+        with self._lock:
+            book = self._conn.execute(
+                "SELECT book_digest, filename FROM contract_books ORDER BY saved_at DESC, rowid DESC LIMIT 1"
+            ).fetchone()
+            if book is None:
+                return None
+            df_rows = pd.read_sql_query(
+                "SELECT * FROM contracts WHERE book_digest = ? ORDER BY position", self._conn, params=(book[0],)
+            )
+        df_book = df_rows.rename(columns={store_col: book_col for book_col, store_col in CONTRACT_COLUMNS.items()})
+        return book[1], df_book[list(CONTRACT_COLUMNS)]